@@ -0,0 +1,445 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2011 Nicolas Paris <nicolas.caen@gmail.com>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+'''
+A client sending many requests at once from a single thread. Requests are
+signed by the ApiPatch, so they carry the same OAuth credentials, and every
+socket is multiplexed by one select loop instead of a thread each.
+'''
+
+import ssl
+import sys
+import time
+import Queue
+import socket
+import httplib
+import asyncore
+import urlparse
+import threading
+from collections import deque
+from StringIO import StringIO
+from urllib2 import URLError
+from twitter import Status, User, DirectMessage
+from connection import PooledResponse
+
+class BufferedSocket(object):
+    '''What httplib.HTTPResponse reads from, the whole response is received'''
+    def __init__(self, data):
+        self._file = StringIO(data)
+
+    def makefile(self, *args, **kwargs):
+        return self._file
+
+class AsyncResult(object):
+    '''The result of a request, known once the loop has run'''
+    def __init__(self, parser):
+        self.parser = parser
+        self.done = False
+        self.value = None
+        self.error = None
+        self.callbacks = []
+
+    def add_callback(self, func):
+        '''@param func, called with the result from the loop once done'''
+        if self.done:
+            func(self)
+        else:
+            self.callbacks.append(func)
+
+    def finish(self, value=None, error=None):
+        self.value = value
+        self.error = error
+        self.done = True
+        for func in self.callbacks:
+            func(self)
+
+    def get(self):
+        '''@return the parsed value, or raise what the request failed with'''
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+class AsyncRequest(asyncore.dispatcher):
+    '''
+    One request over its own connection, closed by the server once the
+    response is sent, so the body ends with the connection
+
+    self.tunnel   True until the proxy opened the way to an https server
+    '''
+    def __init__(self, client, url, body, headers, result, address):
+        '''@param address, resolved ip and port to connect to'''
+        asyncore.dispatcher.__init__(self, map=client.map)
+        self.client = client
+        self.result = result
+        self.received = []
+        self.handshaking = False
+
+        scheme, netloc, path, params, query, fragment = urlparse.urlparse(url)
+        self.https = scheme == 'https'
+        self.host, port = split_netloc(netloc, self.https and 443 or 80)
+        selector = urlparse.urlunparse(('', '', path or '/', params, query, ''))
+        # A plain http proxy wants the absolute url
+        if client.proxy and not self.https:
+            selector = url
+        self.out = self.encode(body is None and 'GET' or 'POST', selector,
+                netloc, body, headers)
+        self.tunnel = bool(client.proxy) and self.https
+        if self.tunnel:
+            self.request = self.out
+            self.out = 'CONNECT %s:%d HTTP/1.1\r\nHost: %s:%d\r\n\r\n' % (
+                    self.host, port, self.host, port)
+
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.connect(address)
+
+    def encode(self, method, selector, netloc, body, headers):
+        headers = dict(headers)
+        headers['Host'] = netloc
+        headers['Connection'] = 'close'
+        if body is not None:
+            headers.setdefault('Content-Type', 'application/x-www-form-urlencoded')
+            headers['Content-Length'] = str(len(body))
+        lines = ['%s %s HTTP/1.1' % (method, selector)]
+        lines.extend('%s: %s' % item for item in headers.items())
+        return '\r\n'.join(lines) + '\r\n\r\n' + (body or '')
+
+    def handle_connect(self):
+        if self.https and not self.tunnel:
+            self.start_tls()
+
+    def start_tls(self):
+        '''The certificate is checked against the host we asked for'''
+        context = ssl.create_default_context()
+        self.socket = context.wrap_socket(self.socket, server_hostname=self.host,
+                do_handshake_on_connect=False)
+        self.handshaking = True
+        self.handshake()
+
+    def handshake(self):
+        try:
+            self.socket.do_handshake()
+            self.handshaking = False
+        except ssl.SSLError, e:
+            if e.args[0] not in (ssl.SSL_ERROR_WANT_READ, ssl.SSL_ERROR_WANT_WRITE):
+                raise
+
+    def writable(self):
+        return not self.connected or self.handshaking or bool(self.out)
+
+    def handle_write(self):
+        if self.handshaking:
+            return self.handshake()
+        sent = self.send(self.out)
+        self.out = self.out[sent:]
+
+    def handle_read(self):
+        if self.handshaking:
+            return self.handshake()
+        if self.tunnel:
+            return self.read_tunnel()
+        try:
+            self.received.append(self.recv(65536))
+            # Decrypted data may wait in the ssl buffer, select will not tell
+            while self.https and self.socket.pending():
+                self.received.append(self.recv(65536))
+        except ssl.SSLError, e:
+            if e.args[0] != ssl.SSL_ERROR_WANT_READ:
+                raise
+
+    def read_tunnel(self):
+        '''The answer of the proxy to CONNECT, then the request goes over
+           tls'''
+        self.received.append(self.recv(65536))
+        answer = ''.join(self.received)
+        if '\r\n\r\n' not in answer:
+            return
+        status = answer.split('\r\n', 1)[0]
+        if status.split(' ')[1:2] != ['200']:
+            raise URLError('Tunnel connection failed: %s' % status)
+        self.tunnel = False
+        self.received = []
+        self.out = self.request
+        self.start_tls()
+
+    def handle_close(self):
+        self.close()
+        response = httplib.HTTPResponse(BufferedSocket(''.join(self.received)))
+        try:
+            response.begin()
+            response = PooledResponse(response)
+        except httplib.HTTPException, e:
+            return self.client.done(self.result, error=URLError(e))
+        self.client.done(self.result, response=response)
+
+    def handle_error(self):
+        error = sys.exc_info()[1]
+        self.close()
+        if not isinstance(error, URLError):
+            error = URLError(error)
+        self.client.done(self.result, error=error)
+
+    def abort(self):
+        self.close()
+        self.client.done(self.result, error=URLError('timed out'))
+
+class AsyncApi(object):
+    '''
+    The operations Tweets uses, returning an AsyncResult instead of waiting.
+    Requests are queued, at most max_requests are in flight, and run()
+    drives them all until they are done.
+
+    self.api            ApiPatch, signs the requests and parses the responses
+    self.max_requests   Requests in flight at once
+    self.rate_limit     RateLimit fed from the responses headers, or None
+    self.proxy          'host:port' of a proxy, or None
+    self.addresses      Resolved address of each host and port
+    self.resolving      Requests waiting for the address of a host and port
+    '''
+    def __init__(self, api, max_requests=10, rate_limit=None, proxy=None):
+        self.api = api
+        self.max_requests = max_requests
+        self.rate_limit = rate_limit
+        self.proxy = proxy
+        self.map = {}
+        self.pending = deque()
+        self.active = 0
+        self.addresses = {}
+        self.resolving = {}
+        self._resolved = Queue.Queue()
+
+    def request(self, url, parser, post_data=None, parameters=None):
+        '''
+        @param parser, from the decoded json to the value of the result
+        @return an AsyncResult
+        '''
+        result = AsyncResult(parser)
+        self.pending.append((url, post_data, parameters, result))
+        self.start_pending()
+        return result
+
+    def start_pending(self):
+        while self.pending and self.active < self.max_requests:
+            url, post_data, parameters, result = self.pending.popleft()
+            # Signed when sent, the oauth timestamp is never stale
+            url, body, headers = self.api._SignRequest(url, post_data, parameters)
+            self.active += 1
+            self.send((url, body, headers, result))
+
+    def send(self, request):
+        '''Connect at once when the address is known, after the lookup
+           otherwise'''
+        endpoint = self.endpoint(request[0])
+        if endpoint in self.addresses:
+            return self.connect(request, self.addresses[endpoint])
+        if endpoint not in self.resolving:
+            self.resolving[endpoint] = []
+            resolver = threading.Thread(target=self.resolve, args=(endpoint,))
+            resolver.daemon = True
+            resolver.start()
+        self.resolving[endpoint].append(request)
+
+    def connect(self, request, address):
+        url, body, headers, result = request
+        try:
+            AsyncRequest(self, url, body, headers, result, address)
+        except socket.error, e:
+            self.done(result, error=URLError(e))
+
+    def endpoint(self, url):
+        '''@return the host and port we connect to for url'''
+        scheme, netloc = urlparse.urlparse(url)[:2]
+        default_port = scheme == 'https' and 443 or 80
+        return split_netloc(self.proxy or netloc, default_port)
+
+    def resolve(self, endpoint):
+        '''In its own thread, the lookup blocks'''
+        try:
+            info = socket.getaddrinfo(endpoint[0], endpoint[1], socket.AF_INET,
+                    socket.SOCK_STREAM)
+            self._resolved.put((endpoint, info[0][4], None))
+        except socket.error, e:
+            self._resolved.put((endpoint, None, e))
+
+    def handle_resolved(self, wait=None):
+        '''
+        Send the requests waiting for the addresses resolved so far
+        @param wait, seconds to wait for one when none came yet
+        '''
+        block = wait is not None
+        while True:
+            try:
+                endpoint, address, error = self._resolved.get(block, wait)
+            except Queue.Empty:
+                return
+            block = False
+            requests = self.resolving.pop(endpoint, [])
+            if error is not None:
+                for request in requests:
+                    self.done(request[3], error=URLError(error))
+                continue
+            self.addresses[endpoint] = address
+            for request in requests:
+                self.connect(request, address)
+
+    def done(self, result, response=None, error=None):
+        self.active -= 1
+        if response is not None:
+            if self.rate_limit is not None:
+                self.rate_limit.update(response.headers)
+            try:
+                data = self.api._ParseAndCheckTwitter(response.data)
+                value = result.parser(data)
+            except Exception, e:
+                result.finish(error=e)
+            else:
+                result.finish(value)
+        else:
+            result.finish(error=error)
+        self.start_pending()
+
+    def run(self, timeout=None):
+        '''
+        Serve every request until they are all done
+        @param timeout, seconds before the requests still running fail
+        '''
+        deadline = timeout and time.time() + timeout
+        while self.map or self.pending or self.resolving:
+            if self.map:
+                asyncore.loop(timeout=0.1, map=self.map, count=1)
+                self.handle_resolved()
+            else:
+                self.handle_resolved(wait=0.1)
+            if deadline and time.time() > deadline:
+                self.abort()
+
+    def abort(self):
+        while self.pending:
+            self.pending.popleft()[3].finish(error=URLError('timed out'))
+        resolving, self.resolving = self.resolving, {}
+        for requests in resolving.values():
+            for request in requests:
+                self.done(request[3], error=URLError('timed out'))
+        for request in self.map.values():
+            request.abort()
+
+    def gather(self, results, timeout=None):
+        '''@return the values of the results, in order, once all are done'''
+        self.run(timeout)
+        return [result.get() for result in results]
+
+    def url(self, path):
+        return '%s/%s' % (self.api.base_url, path)
+
+    def statuses(self, data):
+        return [Status.NewFromJsonDict(x) for x in data]
+
+    def GetHomeTimeline(self, count=None, since_id=None, max_id=None, page=None):
+        return self.request(self.url('statuses/home_timeline.json'), self.statuses,
+                parameters=options(count=count, since_id=since_id,
+                                   max_id=max_id, page=page))
+
+    def GetMentions(self, since_id=None, max_id=None, page=None):
+        return self.request(self.url('statuses/mentions.json'), self.statuses,
+                parameters=options(since_id=since_id, max_id=max_id, page=page))
+
+    def GetUserTimeline(self, screen_name, since_id=None, max_id=None,
+                        page=None, include_rts=True):
+        return self.request(self.url('statuses/user_timeline.json'), self.statuses,
+                parameters=options(screen_name=screen_name, since_id=since_id,
+                                   max_id=max_id, page=page,
+                                   include_rts=include_rts and 1 or None))
+
+    def GetUserRetweets(self, since_id=None, max_id=None):
+        return self.request(self.url('statuses/retweeted_by_me.json'),
+                self.statuses, parameters=options(since_id=since_id, max_id=max_id))
+
+    def GetDirectMessages(self, since_id=None, page=None):
+        return self.request(self.url('direct_messages.json'),
+                lambda data: [DirectMessage.NewFromJsonDict(x) for x in data],
+                parameters=options(since_id=since_id, page=page))
+
+    def GetFavorites(self, page=None):
+        return self.request(self.url('favorites.json'), self.statuses,
+                parameters=options(page=page))
+
+    def GetSearch(self, term, since_id=None, page=1):
+        def parse(data):
+            results = []
+            for x in data['results']:
+                status = Status.NewFromJsonDict(x)
+                status.user = User(screen_name=x['from_user'],
+                                   profile_image_url=x['profile_image_url'])
+                results.append(status)
+            return results
+        return self.request('http://search.twitter.com/search.json', parse,
+                parameters=options(q=term, since_id=since_id, page=page))
+
+    def GetStatus(self, id):
+        return self.request(self.url('statuses/show/%s.json' % id),
+                Status.NewFromJsonDict)
+
+    def GetUser(self, user):
+        return self.request(self.url('users/show/%s.json' % user),
+                User.NewFromJsonDict)
+
+    def PostUpdate(self, status, in_reply_to_status_id=None):
+        if isinstance(status, unicode):
+            status = status.encode('utf-8')
+        return self.request(self.url('statuses/update.json'), Status.NewFromJsonDict,
+                post_data=options(status=status,
+                                  in_reply_to_status_id=in_reply_to_status_id))
+
+    def PostRetweet(self, id):
+        return self.request(self.url('statuses/retweet/%s.json' % id),
+                Status.NewFromJsonDict, post_data={'dummy': None})
+
+    def DestroyStatus(self, id):
+        return self.request(self.url('statuses/destroy/%s.json' % id),
+                Status.NewFromJsonDict, post_data={'id': id})
+
+    def CreateFavorite(self, status):
+        return self.request(self.url('favorites/create/%s.json' % status.id),
+                Status.NewFromJsonDict, post_data={'id': status.id})
+
+    def DestroyFavorite(self, status):
+        return self.request(self.url('favorites/destroy/%s.json' % status.id),
+                Status.NewFromJsonDict, post_data={'id': status.id})
+
+    def CreateFriendship(self, user):
+        return self.request(self.url('friendships/create/%s.json' % user),
+                User.NewFromJsonDict, post_data={'user': user})
+
+    def DestroyFriendship(self, user):
+        return self.request(self.url('friendships/destroy/%s.json' % user),
+                User.NewFromJsonDict, post_data={'user': user})
+
+    def PostDirectMessage(self, user, text):
+        if isinstance(text, unicode):
+            text = text.encode('utf-8')
+        return self.request(self.url('direct_messages/new.json'),
+                DirectMessage.NewFromJsonDict,
+                post_data={'text': text, 'user': user})
+
+def split_netloc(netloc, default_port):
+    '''@return the host and port of host[:port]'''
+    if ':' in netloc:
+        host, port = netloc.rsplit(':', 1)
+        return host, int(port)
+    return netloc, default_port
+
+def options(**kwargs):
+    '''@return the parameters that were given'''
+    return dict((key, value) for key, value in kwargs.items() if value is not None)
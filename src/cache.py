@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2011 Nicolas Paris <nicolas.caen@gmail.com>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Cache of the API responses. Signed urls are all different (oauth nonce,
+timestamp and signature), so responses are kept by the url without them.
+'''
+
+import os
+import time
+import urllib
+import hashlib
+import logging
+import tempfile
+import threading
+import urlparse
+from collections import OrderedDict
+
+# Seconds a response is kept, by part of the url. Statuses hardly change,
+# profiles a little more, timelines are only cached to not send the same
+# request twice in a row. Everything else is never cached.
+TTL = (
+    ('/statuses/show/',             3600),
+    ('/users/show',                 600),
+    ('/statuses/home_timeline',     20),
+    ('/statuses/mentions',          20),
+    ('/statuses/user_timeline',     20),
+    ('/statuses/retweeted_by_me',   20),
+    ('/direct_messages',            20),
+    ('/favorites',                  20),
+    ('/search',                     20),
+)
+
+def get_ttl(url):
+    '''@return the seconds a response to url is kept, 0 to not cache it'''
+    path = urlparse.urlparse(url)[2]
+    for part, ttl in TTL:
+        if part in path:
+            return ttl
+    return 0
+
+def cache_key(url):
+    '''@return the url without the oauth parameters changing for each
+       request, the token is kept as responses depend on the account'''
+    scheme, netloc, path, params, query, fragment = urlparse.urlparse(url)
+    query = [(name, value) for name, value in urlparse.parse_qsl(query, True)
+             if name == 'oauth_token' or not name.startswith('oauth_')]
+    query = urllib.urlencode(sorted(query))
+    return urlparse.urlunparse((scheme, netloc, path, params, query, ''))
+
+class ResponseCache(object):
+    '''
+    The last size responses in memory, the least recently used dropped
+    first, and all of them on disk too when a directory is given. Same
+    methods as the python-twitter _FileCache.
+
+    self.hits       Responses found, and not too old
+    self.misses     Responses asked for but missing or too old
+    '''
+    def __init__(self, size=500, directory=None):
+        self.size = size
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def get(self, key, ttl):
+        '''@return the data cached for key if younger than ttl seconds'''
+        cached_time = self.GetCachedTime(key)
+        if cached_time is not None and time.time() - cached_time < ttl:
+            data = self.Get(key)
+            if data is not None:
+                self.hits += 1
+                return data
+        self.misses += 1
+        return None
+
+    def Get(self, key):
+        with self._lock:
+            try:
+                data, cached_time = self._entries.pop(key)
+                self._entries[key] = (data, cached_time)
+                return data
+            except KeyError:
+                pass
+        data = self.read(key)
+        if data is not None:
+            self.remember(key, data, os.path.getmtime(self.path(key)))
+        return data
+
+    def Set(self, key, data):
+        self.remember(key, data, time.time())
+        self.write(key, data)
+
+    def Remove(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.directory:
+            try:
+                os.remove(self.path(key))
+            except OSError:
+                pass
+
+    def GetCachedTime(self, key):
+        with self._lock:
+            if key in self._entries:
+                return self._entries[key][1]
+        if self.directory and os.path.exists(self.path(key)):
+            return os.path.getmtime(self.path(key))
+        return None
+
+    def remember(self, key, data, cached_time):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (data, cached_time)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def path(self, key):
+        return os.path.join(self.directory, hashlib.md5(key).hexdigest())
+
+    def read(self, key):
+        if not self.directory:
+            return None
+        try:
+            with open(self.path(key)) as f:
+                return f.read()
+        except IOError:
+            return None
+
+    def write(self, key, data):
+        '''Through a temporary file, a reader never gets half a response'''
+        if not self.directory:
+            return
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=self.directory)
+            with os.fdopen(fd, 'w') as f:
+                f.write(data)
+            os.rename(temp_path, self.path(key))
+        except (IOError, OSError), e:
+            logging.warning('Could not cache the response: {0}'.format(e))
+
+    def report(self):
+        asked = self.hits + self.misses
+        return 'Cache: {0} entries, {1} hits, {2} misses ({3:.0%} hit rate)'.format(
+                len(self._entries), self.hits, self.misses,
+                float(self.hits) / max(asked, 1))
@@ -21,7 +21,6 @@ import message
 import constant
 import ConfigParser
 import curses.ascii
-import oauth2 as oauth
 from utils import encode
 try:
     from urlparse import parse_qsl
@@ -58,6 +57,9 @@ class Config(object):
         self.keys = constant.key
         self.params = constant.params
         self.filter = constant.filter
+        self.retention = constant.retention
+        self.retention_buffers = {}
+        self.refresh = dict(constant.refresh)
 
     def get_xdg_config(self):
         try:
@@ -129,6 +131,18 @@ class Config(object):
         self.config_file = self.tyrs_path + 'tyrs.cfg'
         if args.config != None:
             self.config_file += '.' + args.config
+        # Setup the statuses kept between sessions
+        self.store_file = self.tyrs_path + 'tyrs.db'
+        if args.account != None:
+            self.store_file += '.' + args.account
+        # Setup the requests waiting for the network
+        self.outbox_file = self.tyrs_path + 'tyrs.outbox'
+        if args.account != None:
+            self.outbox_file += '.' + args.account
+        # Setup what is remembered between sessions
+        self.session_file = self.tyrs_path + 'tyrs.session'
+        if args.account != None:
+            self.session_file += '.' + args.account
 
     def new_account(self):
 
@@ -178,6 +192,8 @@ class Config(object):
         self.parse_keys()
         self.parse_params()
         self.parse_filter()
+        self.parse_retention()
+        self.parse_refresh()
         self.init_logger()
 
     def parse_color(self):
@@ -303,6 +319,50 @@ class Config(object):
         if self.conf.has_option('params', 'beep'):
             self.params['beep'] = self.conf.getboolean('params', 'beep')
 
+        # HTTP connections kept alive
+        if self.conf.has_option('params', 'pool_size'):
+            self.params['pool_size'] = int(self.conf.get('params', 'pool_size'))
+
+        if self.conf.has_option('params', 'pool_timeout'):
+            self.params['pool_timeout'] = int(self.conf.get('params', 'pool_timeout'))
+
+        # Timelines fetched at the same time
+        if self.conf.has_option('params', 'workers'):
+            self.params['workers'] = int(self.conf.get('params', 'workers'))
+
+        # Refresh intervals following the activity of the timelines
+        for param in ('refresh_adaptive', 'refresh_min', 'refresh_max',
+                      'rate_budget', 'rate_reserve'):
+            if self.conf.has_option('params', param):
+                self.params[param] = int(self.conf.get('params', param))
+
+        # API responses kept
+        if self.conf.has_option('params', 'cache_size'):
+            self.params['cache_size'] = int(self.conf.get('params', 'cache_size'))
+
+        if self.conf.has_option('params', 'read_ahead'):
+            self.params['read_ahead'] = int(self.conf.get('params', 'read_ahead'))
+
+        if self.conf.has_option('params', 'thread_prefetch'):
+            self.params['thread_prefetch'] = int(self.conf.get('params', 'thread_prefetch'))
+
+        if self.conf.has_option('params', 'cache_dir'):
+            self.params['cache_dir'] = os.path.expanduser(self.conf.get('params', 'cache_dir'))
+
+        # Statuses pushed by the user stream instead of polled
+        if self.conf.has_option('params', 'stream'):
+            self.params['stream'] = self.conf.getboolean('params', 'stream')
+
+        if self.conf.has_option('params', 'stream_url'):
+            self.params['stream_url'] = self.conf.get('params', 'stream_url')
+
+        # Statuses kept on disk between sessions
+        if self.conf.has_option('params', 'store'):
+            self.params['store'] = self.conf.getboolean('params', 'store')
+
+        if self.conf.has_option('params', 'store_size'):
+            self.params['store_size'] = int(self.conf.get('params', 'store_size'))
+
     def check_google_tokens(self):
         try:
             from shorter.googl import GooglUrlShorter
@@ -328,6 +388,40 @@ class Config(object):
         if self.conf.has_option('filter', 'except'):
             self.filter['except'] = self.conf.get('filter', 'except').split(' ')
 
+        # One rule per line
+        if self.conf.has_option('filter', 'rules'):
+            rules = self.conf.get('filter', 'rules').split('\n')
+            self.filter['rules'] = [r.strip() for r in rules if r.strip()]
+
+    def parse_retention(self):
+        '''max_statuses and max_age for all buffers, each one could be
+           overridden for one buffer, like home_max_statuses'''
+        if not self.conf.has_section('retention'):
+            return
+        for option in self.conf.options('retention'):
+            value = int(self.conf.get('retention', option))
+            if option in self.retention:
+                self.retention[option] = value
+                continue
+            for policy in self.retention:
+                if option.endswith('_' + policy):
+                    buff = option[:-len(policy)-1]
+                    self.retention_buffers.setdefault(buff, {})[policy] = value
+
+    def parse_refresh(self):
+        '''Minutes between two updates of each timeline, params refresh
+           when not set, 0 to never update it'''
+        for buff in self.refresh:
+            if self.conf.has_option('refresh', buff):
+                self.refresh[buff] = int(self.conf.get('refresh', buff))
+            elif self.refresh[buff] is None:
+                self.refresh[buff] = int(self.params['refresh'])
+
+    def retention_policy(self, buff):
+        policy = dict(self.retention)
+        policy.update(self.retention_buffers.get(buff, {}))
+        return policy
+
     def init_logger(self):
         log_file = self.xdg_config + '/tyrs/tyrs.log'
         lvl = self.init_logger_level()
@@ -386,6 +480,8 @@ class Config(object):
         AUTHORIZATION_URL          = base_url + '/oauth/authorize'
         consumer_key               = self.token[self.service]['consumer_key']
         consumer_secret            = self.token[self.service]['consumer_secret']
+        # Only needed the first time, not imported before
+        import oauth2 as oauth
         signature_method_hmac_sha1 = oauth.SignatureMethod_HMAC_SHA1()
         oauth_consumer             = oauth.Consumer(key=consumer_key, secret=consumer_secret)
         oauth_client               = oauth.Client(oauth_consumer)
@@ -458,11 +554,20 @@ class Config(object):
         except:
             return False
 
-    def save_last_read(self, last_read):
+    def load_my_nick(self):
+
+        try:
+            conf = ConfigParser.RawConfigParser()
+            conf.read(self.token_file)
+            return conf.get('token', 'screen_name')
+        except:
+            return None
+
+    def save_my_nick(self, nick):
 
         conf = ConfigParser.RawConfigParser()
         conf.read(self.token_file)
-        conf.set('token', 'last_read', last_read)
+        conf.set('token', 'screen_name', nick)
 
         with open(self.token_file, 'wb') as tokens:
             conf.write(tokens)
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2011 Nicolas Paris <nicolas.caen@gmail.com>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import gzip
+import time
+import socket
+import httplib
+import logging
+import urlparse
+import threading
+from StringIO import StringIO
+from urllib2 import URLError
+
+class PooledResponse(object):
+    '''
+    A response read in full, so the connection it came from can go back
+    to the pool right away
+    '''
+    def __init__(self, response):
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = dict(response.getheaders())
+        self.data = self.decompress(response.read())
+
+    def decompress(self, raw_data):
+        if self.headers.get('content-encoding') == 'gzip':
+            return gzip.GzipFile(fileobj=StringIO(raw_data)).read()
+        return raw_data
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name.lower(), default)
+
+class ConnectionPool(object):
+    '''
+    Keep HTTP connections alive between requests, so every call does not
+    pay a new TCP and TLS handshake. Idle connections are kept per host,
+    and the pool can be shared by the update thread and the UI thread.
+
+    self.size       Max idle connections kept per host
+    self.timeout    Seconds an idle connection is kept before being dropped
+    self.proxy      'host:port' of a proxy, or None
+    '''
+    def __init__(self, size=4, timeout=60, proxy=None, debug=0):
+        self.size = size
+        self.timeout = timeout
+        self.proxy = proxy
+        self.debug = debug
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def request(self, url, data=None, headers=None, method=None):
+        '''
+        @param url, absolute http or https url
+        @param data, the encoded body, the request is a POST if given
+        @return a PooledResponse, whatever the status code is
+        '''
+        if method is None:
+            method = data and 'POST' or 'GET'
+        headers = dict(headers or {})
+        if data and not 'Content-Type' in headers:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+
+        key, selector = self.split_url(url)
+        conn, reused = self.acquire(key)
+        try:
+            try:
+                response = self.send(conn, method, selector, data, headers)
+            except (socket.error, httplib.HTTPException), e:
+                conn.close()
+                # The server may have dropped an idle connection, give it
+                # a second chance on a fresh one
+                if not reused:
+                    raise
+                logging.debug('Stale connection to {0}: {1}'.format(key[1], e))
+                conn = self.connect(key)
+                response = self.send(conn, method, selector, data, headers)
+            result = PooledResponse(response)
+        except socket.error, e:
+            conn.close()
+            # Callers expect what urllib2 used to raise
+            raise URLError(e)
+
+        if response.will_close:
+            conn.close()
+        else:
+            self.release(key, conn)
+        return result
+
+    def split_url(self, url):
+        scheme, netloc, path, params, query, fragment = urlparse.urlparse(url)
+        selector = urlparse.urlunparse(('', '', path or '/', params, query, ''))
+        # A plain http proxy wants the absolute url
+        if self.proxy and scheme == 'http':
+            selector = url
+        return (scheme, netloc), selector
+
+    def send(self, conn, method, selector, data, headers):
+        conn.request(method, selector, data, headers)
+        return conn.getresponse()
+
+    def acquire(self, key):
+        '''@return a connection for the host, and if it was an idle one'''
+        now = time.time()
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                conn, last_used = idle.pop()
+                if now - last_used < self.timeout:
+                    return conn, True
+                conn.close()
+        return self.connect(key), False
+
+    def release(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.size:
+                idle.append((conn, time.time()))
+                return
+        conn.close()
+
+    def connect(self, key):
+        scheme, netloc = key
+        if scheme == 'https':
+            conn_class = httplib.HTTPSConnection
+        else:
+            conn_class = httplib.HTTPConnection
+
+        if self.proxy:
+            conn = conn_class(self.proxy)
+            if scheme == 'https':
+                conn.set_tunnel(netloc)
+        else:
+            conn = conn_class(netloc)
+        conn.set_debuglevel(self.debug)
+        return conn
+
+    def close(self):
+        with self._lock:
+            for idle in self._idle.values():
+                for conn, last_used in idle:
+                    conn.close()
+            self._idle = {}
+
+_pool = None
+
+def get_pool():
+    '''@return the shared pool, a default one if none was configured'''
+    global _pool
+    if _pool is None:
+        _pool = ConnectionPool()
+    return _pool
+
+def set_pool(pool):
+    global _pool
+    _pool = pool
@@ -36,6 +36,8 @@ color_set = [False, False, False, False, False, False, False, False]
 key = {
     'up':                'k',
     'down':              'j',
+    'page_up':           'p',
+    'page_down':         'n',
     'left':              'J',
     'right':             'K',
     'quit':              'q',
@@ -90,6 +92,22 @@ params = {
     'header_template':      ' {nick}{retweeted}{retweeter} - {time}{reply} {retweet_count} ',
     'proxy':                None,
     'beep':                 False,
+    'pool_size':            4,
+    'pool_timeout':         60,
+    'workers':              4,
+    'refresh_adaptive':     1,
+    'refresh_min':          1,
+    'refresh_max':          30,
+    'rate_budget':          150,
+    'rate_reserve':         10,
+    'cache_size':           500,
+    'cache_dir':            '',
+    'thread_prefetch':      10,
+    'read_ahead':           5,
+    'stream':               False,
+    'store':                True,
+    'store_size':           1000,
+    'stream_url':           'https://userstream.twitter.com/2/user.json',
 }
 
 filter = {
@@ -97,6 +115,20 @@ filter = {
     'myself':           False,
     'behavior':         'all',
     'except':           [],
+    'rules':            [],
+}
+
+refresh = {
+    'home':             None,
+    'mentions':         None,
+    'direct':           None,
+    'search':           5,
+    'user':             10,
+}
+
+retention = {
+    'max_statuses':     1000,
+    'max_age':          0,
 }
 
 token = {
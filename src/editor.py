@@ -16,19 +16,28 @@
 import tyrs
 import curses
 import curses.ascii
+import importlib
 from utils import encode, get_urls
-try:
-    from shorter.ur1ca import Ur1caUrlShorter
-    from shorter.bitly import BitLyUrlShorter
-    from shorter.msudpl import MsudplUrlShorter
-    from shorter.custom import CustomUrlShorter
-except ImportError:
-    pass
-
-try:
-    from shorter.googl import GooglUrlShorter
-except ImportError:
-    pass
+
+# Module and class of each url shortener, only the one used is imported
+# (googl brings the whole google api client)
+SHORTENERS = {
+    'ur1ca':    ('shorter.ur1ca', 'Ur1caUrlShorter'),
+    'bitly':    ('shorter.bitly', 'BitLyUrlShorter'),
+    'googl':    ('shorter.googl', 'GooglUrlShorter'),
+    'msudpl':   ('shorter.msudpl', 'MsudplUrlShorter'),
+    'custom':   ('shorter.curstom', 'CustomUrlShorter'),
+}
+
+def get_shorter(service):
+    module, name = SHORTENERS.get(service, SHORTENERS['ur1ca'])
+    # Relative to our package, the launcher imports tyrs as src.tyrs
+    package = __name__.rpartition('.')[0]
+    if package:
+        module = importlib.import_module('.' + module, package)
+    else:
+        module = importlib.import_module(module)
+    return getattr(module, name)()
 
 class Editor(object):
 
@@ -178,17 +187,7 @@ class TweetEditor(Editor):
                 pass
 
     def _set_service(self):
-        service = self.conf.params['url_shorter']
-        if service == 'bitly':
-            self.shorter = BitLyUrlShorter()
-        elif service == 'googl':
-            self.shorter = GooglUrlShorter()
-        elif service == 'msudpl':
-            self.shorter = MsudplUrlShorter()
-        elif service == 'custom':
-            self.shorter = CustomUrlShorter()
-        else:
-            self.shorter = Ur1caUrlShorter()
+        self.shorter = get_shorter(self.conf.params['url_shorter'])
 
 
 class NickEditor(Editor):
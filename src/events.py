@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2011 Nicolas Paris <nicolas.caen@gmail.com>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Only the UI thread draws with curses. The other threads (updates, worker
+pool) post what they want shown as events, the UI thread handles them
+between two keys.
+'''
+
+import Queue
+import bisect
+import logging
+import threading
+
+class EventQueue(object):
+    '''
+    self.ui_thread    The thread allowed to draw, the one creating the queue
+    self.latency      Time from a key pressed to the screen painted
+    '''
+    def __init__(self):
+        self.ui_thread = threading.current_thread()
+        self.latency = LatencyHistogram()
+        self._events = Queue.Queue()
+
+    def post(self, func, *args):
+        '''Have func(*args) called by the UI thread'''
+        self._events.put((func, args))
+
+    def call(self, func, *args):
+        '''Call func(*args) now on the UI thread, post it from the others'''
+        if threading.current_thread() is self.ui_thread:
+            func(*args)
+        else:
+            self.post(func, *args)
+
+    def drain(self):
+        '''Handle the events posted so far, the same event posted several
+           times is handled once (several timelines updated, one redraw)
+           @return the number of events handled
+        '''
+        events = []
+        while True:
+            try:
+                event = self._events.get_nowait()
+            except Queue.Empty:
+                break
+            if event not in events:
+                events.append(event)
+        for func, args in events:
+            try:
+                func(*args)
+            except Exception:
+                logging.exception('Event {0} failed'.format(func.__name__))
+        return len(events)
+
+class LatencyHistogram(object):
+    '''Count of latencies per bucket, the upper bounds in milliseconds'''
+    BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+
+    def record(self, seconds):
+        index = bisect.bisect_left(self.BOUNDS, seconds * 1000)
+        self.counts[index] += 1
+
+    def percentile(self, p):
+        '''@return the upper bound of the bucket holding the p percentile,
+           None above the last bound or with nothing recorded'''
+        total = sum(self.counts)
+        if not total:
+            return None
+        seen = 0
+        for bound, count in zip(self.BOUNDS, self.counts):
+            seen += count
+            if seen >= total * p / 100.:
+                return bound
+        return None
+
+    def report(self):
+        total = sum(self.counts)
+        buckets = ['<={0}ms: {1}'.format(bound, count)
+                   for bound, count in zip(self.BOUNDS, self.counts) if count]
+        if self.counts[-1]:
+            buckets.append('>{0}ms: {1}'.format(self.BOUNDS[-1], self.counts[-1]))
+        return 'Keypress to paint, {0} keys, p50 <={1}ms, p99 <={2}ms ({3})'.format(
+                total, self.percentile(50), self.percentile(99), ', '.join(buckets))
@@ -15,51 +15,226 @@
 
 import re
 import tyrs
-from utils import get_urls
+import logging
+from utils import URL_REGEX, get_source
 
-class FilterStatus(object):
+WORD_REGEX = re.compile(r'[#@]?\w+', re.UNICODE)
+RETWEET_REGEX = re.compile('^RT @\w+:')
 
-    def __init__(self):
-        self.conf = tyrs.container['conf']
+RULES = (
+    'nick', 'source', 'hashtag', 'keyword', 'regex', 'lang',
+    'has-url', 'is-retweet',
+)
 
-    def filter_status(self, status):
-        self.setup_exception()
+def parse_rule(rule):
+    '''
+    'kind:value', or only 'kind' for has-url and is-retweet
+    @return (kind, value)
+    '''
+    if isinstance(rule, str):
+        rule = rule.decode('utf-8', 'replace')
+    kind, sep, value = rule.strip().partition(':')
+    kind = kind.strip().lower()
+    if kind not in RULES:
+        raise ValueError('unknown filter rule "{0}"'.format(rule))
+    if kind in ('has-url', 'is-retweet'):
+        return kind, None
+    if not value.strip():
+        raise ValueError('filter rule "{0}" needs a value'.format(rule))
+    return kind, value.strip()
+
+class Rules(object):
+    '''
+    All the rules compiled into one decision: nicks, sources, hashtags,
+    single words and languages are sets, phrases are a set of word tuples
+    matched against the n-grams of the text, and regex are merged in one
+    regex. A status costs one tokenization and a few lookups, whatever
+    the number of rules (but the regex).
+    '''
+    def __init__(self, rules):
+        self.nicks = set()
+        self.sources = set()
+        self.words = set()
+        self.phrases = set()
+        self.langs = set()
+        regex = []
+        self.has_url = False
+        self.is_retweet = False
+
+        for rule in rules:
+            try:
+                kind, value = parse_rule(rule)
+            except ValueError, e:
+                logging.warning(e)
+                continue
+            if kind == 'nick':
+                self.nicks.add(value.lstrip('@').lower())
+            elif kind == 'source':
+                self.sources.add(value.lower())
+            elif kind == 'hashtag':
+                self.words.add('#' + value.lstrip('#').lower())
+            elif kind == 'keyword':
+                words = WORD_REGEX.findall(value.lower())
+                if len(words) == 1 and words[0] == value.lower():
+                    self.words.add(words[0])
+                elif words:
+                    self.phrases.add(tuple(words))
+            elif kind == 'regex':
+                regex.append(value)
+            elif kind == 'lang':
+                self.langs.add(value.lower())
+            elif kind == 'has-url':
+                self.has_url = True
+            elif kind == 'is-retweet':
+                self.is_retweet = True
+
+        self.phrase_lengths = sorted(set([len(p) for p in self.phrases]))
+        self.text_regex = self.compile_regex(regex)
+        self.checks = self.build_checks()
+
+    def compile_regex(self, regex):
+        patterns = ['(?:%s)' % p for p in regex]
+        if not patterns:
+            return None
         try:
-            if self.conf.filter['activate']:
-                self.status = status
-                if self.filter_without_url():
-                    if self.filter_without_myself():
-                        if self.filter_exception():
-                            return True
-            return False
-        except:
-            return False
+            return re.compile('|'.join(patterns), re.IGNORECASE | re.UNICODE)
+        except re.error, e:
+            logging.warning('filter rules regex: {0}'.format(e))
+            valid = []
+            for pattern in patterns:
+                try:
+                    re.compile(pattern)
+                    valid.append(pattern)
+                except re.error:
+                    logging.warning('invalid filter regex {0}'.format(pattern))
+            if valid:
+                return re.compile('|'.join(valid), re.IGNORECASE | re.UNICODE)
+            return None
 
-    def filter_without_url(self):
-        urls = get_urls(self.status.text)
-        if len(urls) == 0:
-            return True
+    def build_checks(self):
+        '''Only the checks needed by the configured rules'''
+        checks = []
+        if self.nicks:
+            checks.append(self.match_nick)
+        if self.sources:
+            checks.append(self.match_source)
+        if self.words or self.phrases:
+            checks.append(self.match_words)
+        if self.text_regex:
+            checks.append(self.match_regex)
+        if self.langs:
+            checks.append(self.match_lang)
+        if self.has_url:
+            checks.append(self.match_url)
+        if self.is_retweet:
+            checks.append(self.match_retweet)
+        return checks
+
+    def __len__(self):
+        return len(self.checks)
+
+    def match(self, status):
+        '''@return True if any rule matches the status'''
+        for check in self.checks:
+            if check(status):
+                return True
         return False
 
-    def filter_without_myself(self):
-        if self.conf.filter['myself']:
-            return True
-        if self.conf.my_nick in self.status.text:
-            return False
+    def match_nick(self, status):
+        user = getattr(status, 'user', None)
+        if user:
+            nick = user.screen_name
         else:
+            nick = getattr(status, 'sender_screen_name', '')
+        return nick.lower() in self.nicks
+
+    def match_source(self, status):
+        source = getattr(status, 'source', None)
+        return bool(source) and get_source(source).lower() in self.sources
+
+    def match_words(self, status):
+        words = WORD_REGEX.findall(status.text.lower())
+        if not self.words.isdisjoint(words):
             return True
+        for length in self.phrase_lengths:
+            for i in range(len(words) - length + 1):
+                if tuple(words[i:i+length]) in self.phrases:
+                    return True
+        return False
 
+    def match_regex(self, status):
+        return self.text_regex.search(status.text) is not None
 
-    def filter_exception(self):
-        nick = self.status.user.screen_name
-        if self.conf.filter['behavior'] == 'all':
-            if not nick in self.exception:
-                return True
-        else:
-            if nick in self.exception:
+    def match_lang(self, status):
+        lang = getattr(status, 'lang', None)
+        if not lang:
+            lang = getattr(getattr(status, 'user', None), 'lang', None)
+        return bool(lang) and lang.lower() in self.langs
+
+    def match_url(self, status):
+        return URL_REGEX.search(status.text) is not None
+
+    def match_retweet(self, status):
+        return bool(getattr(status, 'retweeted_status', None)) or \
+                RETWEET_REGEX.match(status.text) is not None
+
+class FilterStatus(object):
+    '''
+    The filter is compiled once from the configuration, and shared by all
+    timelines
+
+    self.exception    Nicks to filter or to keep, depending on the behavior
+    self.my_nick      Lowercase nick, my own statuses are never filtered
+    self.rules        The [filter] rules, a status matching one is filtered
+    '''
+
+    def __init__(self):
+        self.conf = tyrs.container['conf']
+        self.compile()
+
+    def compile(self):
+        self.activate = self.conf.filter['activate']
+        self.myself = self.conf.filter['myself']
+        self.behavior_all = self.conf.filter['behavior'] == 'all'
+        self.exception = frozenset(self.conf.filter['except'])
+        self.rules = Rules(self.conf.filter.get('rules', []))
+        self.nick = None
+        self.my_nick = None
+
+    def setup_myself(self):
+        '''We only know our nick once authenticated'''
+        nick = getattr(self.conf, 'my_nick', None)
+        if nick != self.nick:
+            self.nick = nick
+            self.my_nick = nick and nick.lower()
+
+    def filter(self, statuses):
+        '''@return a new list, with the statuses that pass the filter'''
+        if not self.activate and not self.rules:
+            return list(statuses)
+        self.setup_myself()
+        return [status for status in statuses if not self.filter_status(status)]
+
+    def filter_status(self, status):
+        '''@return True if the status should be filtered'''
+        try:
+            if self.rules and self.rules.match(status):
                 return True
-        return False
+            if self.activate:
+                return self.filter_without_url(status)
+            return False
+        except:
+            return False
 
-    def setup_exception(self):
-        self.exception = self.conf.filter['except']
-        self.exception.append(self.conf.my_nick)
+    def filter_without_url(self, status):
+        if URL_REGEX.search(status.text):
+            return False
+        nick = status.user.screen_name
+        if nick == self.nick:
+            return False
+        if not self.myself and self.my_nick \
+                and self.my_nick in status.text.lower():
+            return False
+        if self.behavior_all:
+            return nick not in self.exception
+        return nick in self.exception
@@ -27,7 +27,7 @@ class Help(object):
         self.max = self.interface.screen.getmaxyx()
         self.interface.screen.timeout(-1)
         self.display_help_screen()
-        self.interface.screen.timeout(500)
+        self.interface.screen.timeout(100)
 
     def display_help_screen (self):
         self.interface.refresh_token = True
@@ -38,6 +38,8 @@ class Help(object):
         self.display_division(_('Navigation'))
         self.display_help_item('up', _('Go up one tweet'))
         self.display_help_item('down', _('Go down one tweet'))
+        self.display_help_item('page_up', _('Go up one screen'))
+        self.display_help_item('page_down', _('Go down one screen'))
         self.display_help_item('back_on_top', _('Go to top of screen'))
         self.display_help_item('back_on_bottom', _('Go to bottom of screen'))
         # Timelines
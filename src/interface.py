@@ -21,9 +21,13 @@ import tyrs
 import signal                   # resize event
 import curses
 import logging
+from collections import OrderedDict
 from user import User
+from viewport import Viewport
 from utils import html_unescape, encode, get_source, get_urls
 
+LAYOUT_CACHE_SIZE = 5000
+
 class Interface(object):
     ''' All dispositions in the screen
 
@@ -38,6 +42,13 @@ class Interface(object):
     self.buffer           The current buffer we're looking at, (home, mentions, direct search)
     self.timelines        Containe all timelines with statuses, all Timeline
                           objects
+    self.layouts          Cache of the wrapped text of the statuses, by id and
+                          everything changing the wrapping or the highlight,
+                          the least recently drawn first
+    self.panels           Statuses on screen since the last display_timeline,
+                          by index in the timeline
+    self.damage           Index of the status the cursor left, when only the
+                          cursor moved since the last display_timeline
     '''
 
     def __init__(self):
@@ -45,6 +56,7 @@ class Interface(object):
         self.conf       = tyrs.container['conf']
         self.timelines  = tyrs.container['timelines']
         self.buffers    = tyrs.container['buffers']
+        self.session    = tyrs.container['session']
         tyrs.container.add('interface', self)
         self.update_last_read_home()
         self.api.set_interface()
@@ -54,6 +66,10 @@ class Interface(object):
         self.stoped = False
         self.buffer           = 'home'
         self.charset = sys.stdout.encoding
+        self.layouts = OrderedDict()
+        self.panels = {}
+        self.panels_first = None
+        self.damage = None
         # resize event
         signal.signal(signal.SIGWINCH, self.sigwinch_handler)
         self.init_screen()
@@ -65,7 +81,8 @@ class Interface(object):
         self.screen = curses.initscr()
         curses.noecho()         # Dont print anything
         #curses.cbreak()
-        self.screen.timeout(500)
+        # Short enough for the events of the other threads to be drawn soon
+        self.screen.timeout(100)
         self.screen.keypad(1)        # Use of arrow keys
         try:
             curses.curs_set(0)      # Dont display cursor
@@ -111,16 +128,27 @@ class Interface(object):
 
     def first_update(self):
         updates = ['home', 'direct', 'mentions', 'user_retweet', 'favorite']
+        # Drawn at once, from the store or empty, while the credentials
+        # and what is new are retrieved in the background
         for buff in updates:
-            self.api.update_timeline(buff)
             self.timelines[buff].reset()
             self.timelines[buff].all_read()
+        self.restore_cursors(updates)
         self.display_timeline()
+        self.api.first_update(updates)
+
+    def restore_cursors(self, buffers):
+        '''Back on the statuses selected when tyrs was left'''
+        for buff in buffers:
+            timeline = self.timelines[buff]
+            with timeline.lock:
+                timeline.find_current(self.session.get('cursor_' + buff))
 
     def handle_resize_event(self):
         self.resize_event = False
         curses.endwin()
         self.set_max_window_size()
+        self.layouts.clear()
         self.display_redraw_screen()
         curses.doupdate()
 
@@ -180,27 +208,109 @@ class Interface(object):
                 self.display_activities()
                 self.display_help_bar()
 
-                # It might have no tweets yet, we try to retrieve some then
+                # It might have no tweets yet, we try to retrieve some then,
+                # without waiting for them
                 if statuses_count  == 0:
-                    self.api.update_timeline(self.buffer)
-                    timeline.reset()
+                    self.api.update_in_background(self.buffer)
 
                 self.current_y = 1
-                for i in range(len(timeline.statuses)):
-                    if i >= timeline.first:
-                        self.check_for_last_read(timeline.statuses[i].id)
-                        br = self.display_status(timeline.statuses[i], i)
+                self.panels = {}
+                self.damage = None
+                first = timeline.first
+                snapshot = None
+                if timeline.statuses:
+                    # A merge may come while drawing, we draw what was
+                    # there when we started
+                    with timeline.lock:
+                        last = self.scroll_to_current(timeline)
+                        snapshot = timeline.snapshot()
+                    first = snapshot.first
+                    for i in xrange(snapshot.first, last + 1):
+                        status = snapshot.statuses[i]
+                        self.check_for_last_read(status.id)
+                        br = self.display_status(status, i)
                         if not br:
                             break
+                self.panels_first = (self.buffer, first)
                 timeline.unread = 0
+                # Only kept in memory, written a bit later
                 if self.buffer == 'home':
-                    self.conf.save_last_read(timeline.last_read)
-                self.screen.refresh()
-                self.check_current_not_on_screen()
+                    self.session.set('last_read', str(timeline.last_read))
+                if snapshot is not None:
+                    self.session.set('cursor_' + self.buffer,
+                            snapshot.statuses[snapshot.current].id)
+                self.update_screen([self.panels[i] for i in sorted(self.panels)])
         except curses.error:
             logging.error('Curses error for display_timeline')
             pass
 
+    def redraw(self):
+        '''Repaint only what changed when the cursor moved on screen,
+           the whole timeline otherwise'''
+        timeline = self.select_current_timeline()
+        with timeline.lock:
+            damage = self.can_display_damage()
+            if damage:
+                try:
+                    self.display_damage()
+                except curses.error:
+                    logging.error('Curses error for display_damage')
+        if not damage:
+            self.display_timeline()
+        timeline = self.select_current_timeline()
+        if timeline.statuses:
+            with timeline.lock:
+                shown = timeline.statuses[timeline.first:timeline.last + 1]
+            self.api.prefetch_threads(shown)
+            self.read_ahead()
+
+    def read_ahead(self):
+        timeline = self.select_current_timeline()
+        depth = self.conf.params['read_ahead']
+        if depth and timeline.count - 1 - timeline.current < depth:
+            self.api.read_ahead(self.buffer)
+
+    def can_display_damage(self):
+        if self.damage is None or self.refresh_token:
+            return False
+        timeline = self.select_current_timeline()
+        if self.panels_first != (self.buffer, timeline.first):
+            return False
+        # A refresh may have shifted the statuses
+        for i in (self.damage, timeline.current):
+            if i not in self.panels or i >= len(timeline.statuses) \
+                    or self.panels[i]['id'] != timeline.statuses[i].id:
+                return False
+        return True
+
+    def display_damage(self):
+        '''Only the headers of the statuses the cursor left and reached,
+           and the counters'''
+        timeline = self.select_current_timeline()
+        old = self.panels[self.damage]
+        new = self.panels[timeline.current]
+        old['panel'].addstr(0, 3, old['header'], self.get_color('header'))
+        new['panel'].addstr(0, 3, new['header'], self.get_color('current_tweet'))
+        self.display_activities()
+        self.damage = None
+        self.update_screen([old, new], header_only=True)
+
+    def update_screen(self, panels, header_only=False):
+        '''Send everything to the terminal at once, the screen first as
+           the panels are over it'''
+        self.screen.noutrefresh()
+        for p in panels:
+            if header_only:
+                bottom = p['y']
+            else:
+                bottom = p['y'] + p['height']
+            try:
+                p['panel'].noutrefresh(0, 0, p['y'], p['x'],
+                    bottom, p['x'] + p['length'])
+            except curses.error:
+                pass
+        curses.doupdate()
+
     def check_for_last_read(self, id):
         if self.buffer == 'home':
             if self.last_read_home == str(id):
@@ -213,24 +323,55 @@ class Interface(object):
     def select_current_timeline(self):
         return self.timelines[self.buffer]
 
-    def check_current_not_on_screen(self):
-        '''TODO this hack should be solved when we realy display tweets'''
-        timeline = self.select_current_timeline()
-        if timeline.current > timeline.last:
-            timeline.current = timeline.last
-            self.display_redraw_screen()
-            self.display_timeline()
+    def get_viewport(self):
+        if self.conf.params['compact']:
+            overlap = 1
+        else:
+            overlap = 0
+        return Viewport(1, self.maxyx[0] - 1, self.status_height, overlap)
+
+    def status_height(self, status):
+        '''The waterline check_for_last_read draws above the last read
+           status takes a line'''
+        height = self.get_layout(status)['height']
+        if self.buffer == 'home' and self.last_read_home == str(status.id):
+            height += 1
+        return height
+
+    def scroll_to_current(self, timeline):
+        '''Move timeline.first so the current status is on screen
+           @return the index of the last status on screen
+        '''
+        count = len(timeline.statuses)
+        timeline.current = max(0, min(timeline.current, count - 1))
+        timeline.first = max(0, min(timeline.first, count - 1))
+        viewport = self.get_viewport()
+        timeline.first = viewport.scroll_to(timeline.statuses,
+                timeline.first, timeline.current)
+        return viewport.last(timeline.statuses, timeline.first)
 
     def display_activities(self):
         '''Main entry to display the activities bar'''
         if self.conf.params['activities']:
             maxyx = self.screen.getmaxyx()
             max_x = maxyx[1]
+            self.display_rate_limit(max_x - 23)
             self.screen.addstr(0, max_x - 23, ' ')
             for b in self.buffers:
                 self.display_buffer_activities(b)
                 self.display_counter_activities(b)
 
+    def display_rate_limit(self, end):
+        '''Requests left to the API, on the left of the activities'''
+        rate_limit = self.api.rate_limit
+        if rate_limit.known():
+            text = ' api:%d ' % rate_limit.remaining
+            if rate_limit.allow():
+                color = 'read'
+            else:
+                color = 'unread'
+            self.screen.addstr(0, end - len(text), text, self.get_color(color))
+
     def display_buffer_activities(self, buff):
         display = {
                 'home': 'H', 'mentions': 'M', 'direct': 'D',
@@ -291,9 +432,9 @@ class Interface(object):
             header = 'encode error'
 
         # We get size and where to display the tweet
-        size = self.get_size_status(status)
-        length = size['length']
-        height = size['height']
+        layout = self.get_layout(status)
+        length = layout['length']
+        height = layout['height']
         start_y = self.current_y
         start_x = self.conf.params['margin']
         # We leave if no more space left
@@ -318,12 +459,11 @@ class Interface(object):
         else:
             panel.addstr(0, 3, header, self.get_color('header'))
 
-        self.display_text(panel, status)
-        try:
-            panel.refresh(0, 0, start_y, start_x,
-                start_y + height, start_x + length)
-        except curses.error:
-            pass
+        self.display_text(panel, layout)
+        self.panels[i] = {
+            'panel': panel, 'id': status.id, 'header': header,
+            'y': start_y, 'x': start_x, 'height': height, 'length': length,
+        }
         # An adjustment to compress a little the display
         if self.conf.params['compact']:
             c = -1
@@ -347,72 +487,77 @@ class Interface(object):
                     text = status.retweeted_status.text
         return text
 
-    def display_text(self, panel, status):
+    def display_text(self, panel, layout):
+        for line, x, word, color in layout['words']:
+            try:
+                panel.addstr(line, x, word, self.get_color(color))
+            except curses.error:
+                pass
+
+    def get_layout(self, status):
+        '''The layout of a status only changes with the window size and the
+           display params, so it is computed once, and not on every redraw
+        '''
+        # Our nick is highlighted, it is known once the credentials are
+        # verified
+        key = (status.id, self.maxyx[1], self.conf.params['margin'],
+               self.conf.params['padding'], self.conf.params['compact'],
+               self.api.myself.screen_name)
+        try:
+            layout = self.layouts.pop(key)
+        except KeyError:
+            # The least recently drawn go first
+            while len(self.layouts) >= LAYOUT_CACHE_SIZE:
+                self.layouts.popitem(last=False)
+            layout = self.build_layout(status)
+        self.layouts[key] = layout
+        return layout
+
+    def build_layout(self, status):
         '''needed to cut words properly, as it would cut it in a midle of a
         world without. handle highlighting of '#' and '@' tags.
+        @return dict with the height and length of the panel, and the words
+                as (line, x, encoded word, color)
         '''
         text = self.get_text(status)
         words = text.split(' ')
         margin = self.conf.params['margin']
         padding = self.conf.params['padding']
         myself = self.api.myself.screen_name
+        max_x = self.maxyx[1] - (margin + padding)*2
         curent_x = padding
         line = 1
-
-        hashtag = encode('#')
-        attag = encode('@')
-
+        spans = []
 
         for word in words:
-            word = encode(word)
-            if curent_x + len(word) > self.maxyx[1] - (margin + padding)*2:
+            if curent_x + len(word) > max_x:
                 line += 1
                 curent_x = padding
 
             if word != '':
                 # The word is an HASHTAG ? '#'
-                if word[0] == hashtag:
-                    panel.addstr(line, curent_x, word, self.get_color('hashtag'))
+                if word[0] == '#':
+                    color = 'hashtag'
                 # Or is it an 'AT TAG' ? '@'
-                elif word[0] == attag:
+                elif word[0] == '@':
                     # The AT TAG is,  @myself
-                    if word == attag + myself or word == attag + myself+ encode(':'):
-                        panel.addstr(line, curent_x, word, self.get_color('highlight'))
+                    if word == '@' + myself or word == '@' + myself + ':':
+                        color = 'highlight'
                     # @anyone
                     else:
-                        panel.addstr(line, curent_x, word, self.get_color('attag'))
+                        color = 'attag'
                 # It's just a normal word
                 else:
-                    try:
-                        panel.addstr(line, curent_x, word, self.get_color('text'))
-                    except curses.error:
-                        pass
+                    color = 'text'
+                spans.append((line, curent_x, encode(word), color))
+                # the width on screen, not the length once encoded
                 curent_x += len(word) + 1
 
-                # We check for ugly empty spaces
-                while panel.inch(line, curent_x -1) == ord(' ') and panel.inch(line, curent_x -2) == ord(' '):
-                    curent_x -= 1
-
-    def get_size_status(self, status):
-        '''Allow to know how height will be the tweet, it calculate it exactly
-           as it will display it.
-        '''
-        length = self.get_max_lenght()
-        margin = self.conf.params['margin']
-        padding = self.conf.params['padding']
-        x = padding+margin
-        y = 1
-        txt = self.get_text(status)
-        words = txt.split(' ')
-        for w in words:
-            if x+len(w) > length - (padding+margin)*2:
-                y += 1
-                x = padding+margin
-            x += len(w)+1
-
-        height = y + 2
-        size = {'length': length, 'height': height}
-        return size
+        return {
+            'length': self.get_max_lenght(),
+            'height': line + 2,
+            'words': spans,
+        }
 
     def get_max_lenght(self):
         adjust = self.conf.params['margin'] + self.conf.params['padding']
@@ -514,6 +659,7 @@ class Interface(object):
         curses.nocbreak()
         curses.curs_set(1)
         curses.endwin()
+        self.session.flush()
 
     def sigwinch_handler(self, *dummy):
         '''Resize event callback'''
@@ -521,14 +667,12 @@ class Interface(object):
 
     def clear_statuses(self):
         timeline = self.select_current_timeline()
-        timeline.statuses = [timeline.statuses[0]]
-        timeline.count_statuses()
+        timeline.clear()
         timeline.reset()
 
     def current_status(self):
         '''@return the status object itself'''
-        timeline = self.select_current_timeline()
-        return timeline.statuses[timeline.current]
+        return self.select_current_timeline().current_status()
 
     def get_color(self, color):
         '''Return the curses code, with bold if enable of the color
@@ -543,38 +687,75 @@ class Interface(object):
 
     def move_down(self):
         timeline = self.select_current_timeline()
-        if timeline.current < timeline.count - 1:
-            if timeline.current >= timeline.last:
-                timeline.first += 1
-            timeline.current += 1
-        else:
+        with timeline.lock:
+            at_end = timeline.current >= timeline.count - 1
+            if not at_end:
+                # the viewport follows when it goes past the screen
+                if timeline.current < timeline.last:
+                    self.damage = timeline.current
+                timeline.current += 1
+        if at_end:
             self.lazzy_load()
 
     def lazzy_load(self):
+        # the page is already on its way
+        if self.buffer in self.api.reading_ahead:
+            return
+        if not self.api.can_request():
+            return
+        self.api.load_older_in_background(self.buffer)
+
+    def older_loaded(self, buffer):
+        '''The page asked by lazzy_load came, the cursor goes on it'''
+        if buffer != self.buffer:
+            return
         timeline = self.select_current_timeline()
-        timeline.page += 1
-        statuses = self.api.retreive_statuses(self.buffer, timeline.page)
-        timeline.append_old_statuses(statuses)
-        timeline.first += 1
-        timeline.current += 1
+        with timeline.lock:
+            if timeline.current < timeline.count - 1:
+                timeline.current += 1
+        self.display_timeline()
 
     def move_up(self):
         timeline = self.select_current_timeline()
-        if timeline.current > 0:
-            # if we need to move up the list to display
-            if timeline.current == timeline.first:
-                timeline.first -= 1
-            timeline.current -= 1
+        with timeline.lock:
+            if timeline.current > 0:
+                if timeline.current > timeline.first:
+                    self.damage = timeline.current
+                timeline.current -= 1
 
     def back_on_bottom(self):
         timeline = self.select_current_timeline()
-        timeline.current = timeline.last
+        with timeline.lock:
+            timeline.current = min(timeline.last, max(timeline.count - 1, 0))
 
     def back_on_top(self):
         timeline = self.select_current_timeline()
-        timeline.current = 0
+        self.jump_to(0)
         timeline.reset()
 
+    def page_down(self):
+        timeline = self.select_current_timeline()
+        with timeline.lock:
+            if timeline.last >= timeline.count - 1:
+                timeline.current = timeline.count - 1
+            else:
+                self.jump_to(self.get_viewport().page_down(timeline.statuses,
+                    timeline.first))
+
+    def page_up(self):
+        timeline = self.select_current_timeline()
+        with timeline.lock:
+            self.jump_to(self.get_viewport().page_up(timeline.statuses,
+                timeline.first))
+
+    def jump_to(self, index):
+        '''Put the status at index on top of the screen, and select it'''
+        timeline = self.select_current_timeline()
+        with timeline.lock:
+            if timeline.count:
+                index = max(0, min(index, timeline.count - 1))
+                timeline.first = timeline.current = index
+
     def openurl(self):
         urls = get_urls(self.current_status().text)
         for url in urls:
@@ -584,10 +765,14 @@ class Interface(object):
                 pass
 
     def update_last_read_home(self):
-        self.last_read_home = self.conf.load_last_read()
+        self.last_read_home = self.session.get('last_read')
 
     def current_user_info(self):
-        User(self.current_status().user)
+        # Timelines only keep a compact user, the profile is retrieved
+        self.api.get_user(self.current_status().user.screen_name)
+
+    def display_user(self, user):
+        User(user)
 
     def beep(self):
         return curses.beep()
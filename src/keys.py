@@ -14,6 +14,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import tyrs
+import time
 import curses
 from help import Help
 from utils import open_image
@@ -28,17 +29,22 @@ class Keys(object):
         self.conf       = tyrs.container['conf']
         self.interface  = tyrs.container['interface']
         self.api        = tyrs.container['api']
+        self.events     = tyrs.container['events']
 
     def handleKeyBinding(self):
         '''Should have all keybinding handle here'''
         while True:
 
+            # What the other threads want on screen
+            self.events.drain()
+
             if self.interface.resize_event:
                 self.interface.handle_resize_event()
                 self.interface.erase_flash_message()
                 self.interface.display_timeline()
 
             ch = self.interface.screen.getch()
+            start = time.time()
 
             # DOWN
             if ch == self.conf.keys['down'] or ch == curses.KEY_DOWN:
@@ -46,6 +52,12 @@ class Keys(object):
             # UP
             elif ch == self.conf.keys['up'] or ch == curses.KEY_UP:
                 self.interface.move_up()
+            # PAGE DOWN
+            elif ch == self.conf.keys['page_down'] or ch == curses.KEY_NPAGE:
+                self.interface.page_down()
+            # PAGE UP
+            elif ch == self.conf.keys['page_up'] or ch == curses.KEY_PPAGE:
+                self.interface.page_up()
             # LEFT
             elif ch == self.conf.keys['left'] or ch == curses.KEY_LEFT:
                 self.interface.navigate_buffer(-1)
@@ -75,7 +87,7 @@ class Keys(object):
                 self.interface.clear_statuses()
             # UPDATE
             elif ch == self.conf.keys['update']:
-                self.api.update_timeline(self.interface.buffer)
+                self.api.update_in_background(self.interface.buffer)
             # FOLLOW SELECTED
             elif ch == self.conf.keys['follow_selected']:
                 self.api.follow_selected()
@@ -152,4 +164,5 @@ class Keys(object):
                 continue
 
             self.interface.erase_flash_message()
-            self.interface.display_timeline()
+            self.interface.redraw()
+            self.events.latency.record(time.time() - start)
@@ -58,6 +58,22 @@ class FlashMessage(object):
             _('Search results for %s'),
             _('Couldn\'t search for %s'),
             ],
+        'user': [
+            '',
+            _('Couldn\'t retrieve the profile of %s'),
+            ],
+        'offline': [
+            '',
+            _('Offline, it will be sent once connected'),
+            ],
+        'online': [
+            _('Back online, %s queued actions sent'),
+            '',
+            ],
+        'rate_limit': [
+            '',
+            _('API limit reached, try again in %s minutes'),
+            ],
         'empty': [
             '',''
         ]
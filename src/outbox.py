@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2011 Nicolas Paris <nicolas.caen@gmail.com>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+'''
+Changes the user asked for while offline (tweets, retweets, favorites,
+follows...), kept on disk until they are sent.
+'''
+
+import time
+import sqlite3
+import threading
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS outbox (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    event       TEXT NOT NULL,
+    string      TEXT,
+    method      TEXT NOT NULL,
+    args        TEXT NOT NULL,
+    created_at  INTEGER NOT NULL,
+    attempts    INTEGER NOT NULL DEFAULT 0
+);
+'''
+
+def encode_arg(arg):
+    '''Favorites are given the status, only its id matters'''
+    if hasattr(arg, 'id'):
+        return {'status': arg.id}
+    return arg
+
+def decode_arg(arg):
+    if isinstance(arg, dict) and 'status' in arg:
+        from twitter import Status
+        return Status(id=arg['status'])
+    return arg
+
+class Outbox(object):
+    '''
+    Requests in the order they were asked for, a request stays until it
+    is sent or refused by twitter.
+    '''
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM outbox').fetchone()[0]
+
+    def add(self, event, string, method, args):
+        '''
+        @param event, string, the flash message if it is refused
+        @param method, name of the ApiPatch method to call with args
+        '''
+        args = json.dumps([encode_arg(arg) for arg in args])
+        with self._lock:
+            with self._db:
+                self._db.execute(
+                    'INSERT INTO outbox (event, string, method, args, created_at) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (event, string, method, args, int(time.time())))
+
+    def pending(self):
+        '''@return (id, event, string, method, args) of every request, oldest first'''
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT id, event, string, method, args FROM outbox '
+                'ORDER BY id').fetchall()
+        return [(id, event, string, method, [decode_arg(arg) for arg in json.loads(args)])
+                for id, event, string, method, args in rows]
+
+    def remove(self, id):
+        with self._lock:
+            with self._db:
+                self._db.execute('DELETE FROM outbox WHERE id = ?', (id,))
+
+    def retry(self, id):
+        with self._lock:
+            with self._db:
+                self._db.execute(
+                    'UPDATE outbox SET attempts = attempts + 1 WHERE id = ?', (id,))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
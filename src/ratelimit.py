@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2011 Nicolas Paris <nicolas.caen@gmail.com>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+import logging
+import threading
+
+class RateLimit(object):
+    '''
+    What is left of the API budget, read from the X-RateLimit-* headers of
+    every response. The last requests of a window are kept for what the
+    user asks for, automatic updates stop before them.
+
+    self.limit      Requests allowed in a window, None until twitter tells
+    self.remaining  Requests left in the current window
+    self.reset      When the next window starts, in seconds since the epoch
+    self.reserve    Requests kept for interactive actions
+    '''
+    def __init__(self, reserve=10):
+        self.reserve = reserve
+        self.limit = None
+        self.remaining = None
+        self.reset = None
+        self._lock = threading.Lock()
+
+    def update(self, headers):
+        '''@param headers, response headers, with lower case names'''
+        try:
+            limit = int(headers['x-ratelimit-limit'])
+            remaining = int(headers['x-ratelimit-remaining'])
+            reset = int(headers['x-ratelimit-reset'])
+        except (KeyError, ValueError):
+            return
+        with self._lock:
+            self.limit = limit
+            self.remaining = remaining
+            self.reset = reset
+        logging.debug('Rate limit: {0}/{1}'.format(remaining, limit))
+
+    def known(self):
+        return self.remaining is not None and time.time() < self.reset
+
+    def allow(self, interactive=False):
+        '''@return False when the request should not be sent now'''
+        with self._lock:
+            if not self.known():
+                return True
+            if interactive:
+                return self.remaining > 0
+            return self.remaining > self.reserve
+
+    def wait(self):
+        '''@return seconds before the next window'''
+        if not self.known():
+            return 0
+        return max(0, self.reset - time.time())
+
+    def hourly_budget(self):
+        '''@return the requests an hour automatic updates may still use
+           in this window, None when unknown'''
+        with self._lock:
+            if not self.known():
+                return None
+            left = max(0, self.remaining - self.reserve)
+            return left * 3600. / max(self.reset - time.time(), 1)
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2011 Nicolas Paris <nicolas.caen@gmail.com>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import logging
+import tempfile
+import threading
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+# Seconds a change waits before being written, the next ones join it
+FLUSH_DELAY = 2
+
+class Session(object):
+    '''
+    What tyrs remembers between two sessions (last read status, cursor of
+    each buffer). It is kept in memory and written at most once every
+    FLUSH_DELAY seconds, to a temporary file renamed over the previous
+    one, so a crash never leaves it half written.
+
+    self.path     The JSON file
+    self.delay    Seconds before a change is written
+    '''
+    def __init__(self, path, delay=FLUSH_DELAY):
+        self.path = path
+        self.delay = delay
+        self.state = self.load()
+        self.dirty = False
+        self.timer = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def load(self):
+        try:
+            with open(self.path) as session:
+                return json.load(session)
+        except (IOError, ValueError):
+            return {}
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self.state.get(key, default)
+
+    def set(self, key, value):
+        with self._lock:
+            if self.state.get(key) == value:
+                return
+            self.state[key] = value
+            self.dirty = True
+            if self.timer is None:
+                self.timer = threading.Timer(self.delay, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        '''Write the changes now, if any'''
+        with self._write_lock:
+            with self._lock:
+                if self.timer is not None:
+                    self.timer.cancel()
+                    self.timer = None
+                if not self.dirty:
+                    return
+                data = json.dumps(self.state)
+                self.dirty = False
+            try:
+                self.write(data)
+            except (IOError, OSError), e:
+                logging.error('Cannot save the session: {0}'.format(e))
+
+    def write(self, data):
+        directory = os.path.dirname(self.path) or '.'
+        fd, temp = tempfile.mkstemp(dir=directory, prefix='.session')
+        try:
+            with os.fdopen(fd, 'w') as session:
+                session.write(data)
+                session.flush()
+                os.fsync(session.fileno())
+            os.rename(temp, self.path)
+        except:
+            os.remove(temp)
+            raise
@@ -13,7 +13,6 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import urllib2
 try:
     import json
 except:
@@ -33,5 +32,5 @@ class BitLyUrlShorter(UrlShorter):
     def do_shorter(self, url):
         long_url = self._quote_url(url)
         request = self.base % (VERION, LOGIN, APIKEY, long_url)
-        response = json.loads(urllib2.urlopen(request).read())
+        response = json.loads(self._get_request(request))
         return response['results'][url]['shortUrl']
@@ -14,6 +14,11 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import urllib2
+try:
+    from ..connection import get_pool
+except ValueError:
+    # shorter is imported as a top level package (tests)
+    from connection import get_pool
 
 class UrlShorter(object):
 
@@ -23,4 +28,4 @@ class UrlShorter(object):
         return long_url
 
     def _get_request(self, url, data=None):
-        return urllib2.urlopen(url, data).read()
+        return get_pool().request(url, data).data
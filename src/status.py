@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2011 Nicolas Paris <nicolas.caen@gmail.com>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+Compact records holding only what tyrs displays of a status, they replace
+the python-twitter Status, User and DirectMessage objects (and all the
+entities they carry) in the timelines.
+'''
+
+import time
+import rfc822
+import calendar
+import threading
+from collections import OrderedDict
+
+def compact(status):
+    if isinstance(status, (CompactStatus, CompactDirectMessage)):
+        return status
+    if hasattr(status, 'sender_screen_name'):
+        return CompactDirectMessage(status)
+    return CompactStatus(status)
+
+def seconds(created_at):
+    try:
+        return calendar.timegm(rfc822.parsedate(created_at))
+    except TypeError:
+        return 0
+
+def relative_time(created_at_in_seconds):
+    '''Same wording as python-twitter, but always from the current time'''
+    fudge = 1.25
+    delta  = long(time.time()) - long(created_at_in_seconds)
+
+    if delta < (1 * fudge):
+        return 'about a second ago'
+    elif delta < (60 * (1/fudge)):
+        return 'about %d seconds ago' % (delta)
+    elif delta < (60 * fudge):
+        return 'about a minute ago'
+    elif delta < (60 * 60 * (1/fudge)):
+        return 'about %d minutes ago' % (delta / 60)
+    elif delta < (60 * 60 * fudge) or delta / (60 * 60) == 1:
+        return 'about an hour ago'
+    elif delta < (60 * 60 * 24 * (1/fudge)):
+        return 'about %d hours ago' % (delta / (60 * 60))
+    elif delta < (60 * 60 * 24 * fudge) or delta / (60 * 60 * 24) == 1:
+        return 'about a day ago'
+    else:
+        return 'about %d days ago' % (delta / (60 * 60 * 24))
+
+class CompactUser(object):
+    '''The full profile is retrieved again when we need it (user info)'''
+    __slots__ = ('id', 'screen_name', 'name', 'profile_image_url')
+
+    def __init__(self, user):
+        self.id = user.id
+        self.screen_name = user.screen_name
+        self.name = user.name
+        self.profile_image_url = user.profile_image_url
+
+class CompactStatus(object):
+    __slots__ = (
+        'id', 'text', 'created_at', 'created_at_in_seconds', 'source',
+        'user', 'in_reply_to_screen_name', 'in_reply_to_status_id',
+        'retweet_count', 'retweeted_status', 'rt',
+    )
+
+    def __init__(self, status):
+        self.id = status.id
+        self.text = status.text
+        self.created_at = status.created_at
+        self.created_at_in_seconds = seconds(status.created_at)
+        self.source = status.source
+        self.user = CompactUser(status.user)
+        self.in_reply_to_screen_name = status.in_reply_to_screen_name
+        self.in_reply_to_status_id = status.in_reply_to_status_id
+        self.retweet_count = status.retweet_count
+        self.retweeted_status = None
+        if status.retweeted_status:
+            self.retweeted_status = CompactStatus(status.retweeted_status)
+        self.rt = None
+
+    def GetCreatedAtInSeconds(self):
+        return self.created_at_in_seconds
+
+    def GetRelativeCreatedAt(self):
+        return relative_time(self.created_at_in_seconds)
+
+class CompactDirectMessage(object):
+    '''No user, the interface tells direct messages apart with that'''
+    __slots__ = (
+        'id', 'text', 'created_at', 'created_at_in_seconds',
+        'sender_screen_name', 'recipient_screen_name', 'rt',
+    )
+
+    def __init__(self, message):
+        self.id = message.id
+        self.text = message.text
+        self.created_at = message.created_at
+        self.created_at_in_seconds = seconds(message.created_at)
+        self.sender_screen_name = message.sender_screen_name
+        self.recipient_screen_name = message.recipient_screen_name
+        self.rt = None
+
+    def GetCreatedAtInSeconds(self):
+        return self.created_at_in_seconds
+
+    def GetRelativeCreatedAt(self):
+        return relative_time(self.created_at_in_seconds)
+
+class StatusCache(object):
+    '''
+    Statuses by id, from every timeline and every status retrieved alone,
+    so a thread is first looked for in what we already hold. The least
+    recently added are dropped first.
+    '''
+    def __init__(self, size=5000):
+        self.size = size
+        self._statuses = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, id):
+        return id in self._statuses
+
+    def get(self, id):
+        return self._statuses.get(id)
+
+    def add(self, status):
+        '''@return the status, as a compact record'''
+        status = compact(status)
+        self.add_all([status])
+        return status
+
+    def add_all(self, statuses):
+        '''@param statuses, compact records'''
+        with self._lock:
+            for status in statuses:
+                self._statuses.pop(status.id, None)
+                self._statuses[status.id] = status
+            while len(self._statuses) > self.size:
+                self._statuses.popitem(last=False)
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2011 Nicolas Paris <nicolas.caen@gmail.com>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+'''
+Statuses kept on disk between two sessions, so the timelines are drawn at
+once on startup and only what is new is asked for.
+'''
+
+import time
+import logging
+import sqlite3
+import threading
+from status import compact, CompactUser, CompactStatus, CompactDirectMessage
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS statuses (
+    id          INTEGER NOT NULL,
+    timeline    TEXT NOT NULL,
+    author      TEXT,
+    created_at  INTEGER,
+    data        TEXT NOT NULL,
+    PRIMARY KEY (timeline, id)
+);
+CREATE INDEX IF NOT EXISTS statuses_id ON statuses (id);
+CREATE INDEX IF NOT EXISTS statuses_author ON statuses (author);
+CREATE INDEX IF NOT EXISTS statuses_created_at ON statuses (created_at);
+'''
+
+RECORDS = dict((cls.__name__, cls)
+               for cls in (CompactUser, CompactStatus, CompactDirectMessage))
+
+# Timelines worth keeping, the others depend on what the user looks for
+TIMELINES = ('home', 'mentions', 'direct', 'user_retweet', 'favorite')
+
+def dump(record):
+    '''@return a compact record as a dict json can encode'''
+    data = {'type': type(record).__name__}
+    for name in record.__slots__:
+        value = getattr(record, name)
+        if isinstance(value, tuple(RECORDS.values())):
+            value = dump(value)
+        data[name] = value
+    # A regex match of the interface, found again when displayed
+    data.pop('rt', None)
+    return data
+
+def load(data):
+    '''@return the compact record dumped in data'''
+    record = object.__new__(RECORDS[data['type']])
+    for name in record.__slots__:
+        value = data.get(name)
+        if isinstance(value, dict):
+            value = load(value)
+        setattr(record, name, value)
+    return record
+
+def author(status):
+    if hasattr(status, 'user'):
+        return status.user.screen_name
+    return status.sender_screen_name
+
+class StatusStore(object):
+    '''
+    The statuses of each timeline in a SQLite database. Every fetch is
+    written in a single transaction, and only the newest statuses of each
+    timeline are kept.
+
+    self.size   Statuses kept for each timeline
+    '''
+    def __init__(self, path, size=1000):
+        self.size = size
+        # Written by the workers and the update thread, one at a time
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+
+    def load(self, timeline):
+        '''@return the statuses kept for the timeline, newest first'''
+        start = time.time()
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT data FROM statuses WHERE timeline = ? '
+                'ORDER BY id DESC LIMIT ?', (timeline, self.size)).fetchall()
+        statuses = [load(json.loads(row[0])) for row in rows]
+        logging.debug('{0} "{1}" statuses loaded in {2:.3f}s'.format(
+            len(statuses), timeline, time.time() - start))
+        return statuses
+
+    def save(self, timeline, statuses):
+        '''Add or replace the statuses, and drop the oldest ones'''
+        if not statuses:
+            return
+        rows = []
+        for status in statuses:
+            status = compact(status)
+            rows.append((status.id, timeline, author(status),
+                         status.created_at_in_seconds, json.dumps(dump(status))))
+        with self._lock:
+            with self._db:
+                self._db.executemany(
+                    'INSERT OR REPLACE INTO statuses '
+                    '(id, timeline, author, created_at, data) '
+                    'VALUES (?, ?, ?, ?, ?)', rows)
+                self._db.execute(
+                    'DELETE FROM statuses WHERE timeline = ? AND id < ('
+                    'SELECT MIN(id) FROM (SELECT id FROM statuses '
+                    'WHERE timeline = ? ORDER BY id DESC LIMIT ?))',
+                    (timeline, timeline, self.size))
+
+    def clear(self, timeline):
+        with self._lock:
+            with self._db:
+                self._db.execute('DELETE FROM statuses WHERE timeline = ?',
+                                 (timeline,))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
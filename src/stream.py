@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2011 Nicolas Paris <nicolas.caen@gmail.com>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import re
+import tyrs
+import socket
+import httplib
+import logging
+import threading
+from twitter import Status, DirectMessage
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+# Twitter sends a blank line every 30 seconds, a silent stream is dead
+STALL_TIMEOUT = 90
+
+class StreamError(Exception):
+    def __init__(self, status, reason):
+        Exception.__init__(self, '%d %s' % (status, reason))
+        self.status = status
+
+class StreamParser(object):
+    '''
+    Decodes newline delimited json as it arrives, a message may be split
+    over several reads and a read may hold several messages
+    '''
+    def __init__(self):
+        self.buffer = ''
+
+    def feed(self, data):
+        '''@return the messages completed by data'''
+        lines = (self.buffer + data).split('\n')
+        self.buffer = lines.pop()
+        messages = []
+        for line in lines:
+            line = line.strip()
+            # keep-alive
+            if not line:
+                continue
+            try:
+                messages.append(json.loads(line))
+            except ValueError:
+                logging.error('Stream: cannot decode {0!r}'.format(line[:80]))
+        return messages
+
+class Backoff(object):
+    '''
+    Delays between reconnections, as twitter asks: growing linearly after
+    network errors, doubling after HTTP errors, and starting at a minute
+    when we are rate limited
+    '''
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.delay = 0
+
+    def network_error(self):
+        self.delay = min(self.delay + 0.25, 16)
+        return self.delay
+
+    def http_error(self, status):
+        first = status == 420 and 60 or 5
+        self.delay = min(max(self.delay * 2, first), 320)
+        return self.delay
+
+class StreamThread(threading.Thread):
+    '''
+    Keeps a connection to the user stream, and merges the statuses in the
+    home, mentions and direct timelines as they arrive. While the stream
+    is connected, the update thread does not poll these timelines.
+
+    self.connected    True while the stream is up
+    self.connections  Successful connections so far
+    '''
+    buffers = ('home', 'mentions', 'direct')
+
+    def __init__(self, url):
+        self.url = url
+        self.conf = tyrs.container['conf']
+        self.api = tyrs.container['api']
+        self.pool = tyrs.container['pool']
+        self.events = tyrs.container['events']
+        self.timelines = tyrs.container['timelines']
+        threading.Thread.__init__(self, target=self.run)
+        self.daemon = True
+        self.connected = False
+        self.connections = 0
+        self.backoff = Backoff()
+        self.stopped = threading.Event()
+        self.conn = None
+
+    def covers(self, buff):
+        return self.connected and buff in self.buffers
+
+    def run(self):
+        logging.info('Stream started')
+        while not self.stopped.is_set():
+            try:
+                self.follow()
+                delay = self.backoff.network_error()
+            except StreamError, e:
+                logging.error('Stream: {0}'.format(e))
+                delay = self.backoff.http_error(e.status)
+            except (socket.error, httplib.HTTPException), e:
+                logging.error('Stream: {0}'.format(e))
+                delay = self.backoff.network_error()
+            finally:
+                self.connected = False
+                self.close()
+            if not self.stopped.is_set():
+                logging.info('Stream reconnecting in {0}s'.format(delay))
+            self.stopped.wait(delay)
+        logging.info('Stream stoped')
+
+    def follow(self):
+        '''Reads the stream until it is closed'''
+        response = self.connect()
+        parser = StreamParser()
+        for data in self.read(response):
+            if not self.connected:
+                self.on_connect()
+            self.dispatch(parser.feed(data))
+
+    def connect(self):
+        url, body, headers = self.api.api._SignRequest(self.url)
+        key, selector = self.pool.split_url(url)
+        self.conn = self.pool.connect(key)
+        self.conn.connect()
+        self.conn.sock.settimeout(STALL_TIMEOUT)
+        self.conn.request('GET', selector, None, headers)
+        response = self.conn.getresponse(buffering=True)
+        if response.status != 200:
+            raise StreamError(response.status, response.reason)
+        return response
+
+    def read(self, response):
+        '''
+        Yields every chunk as soon as it is received, httplib would wait
+        for the amount asked
+        '''
+        while not self.stopped.is_set():
+            if response.chunked:
+                try:
+                    size = int(response.fp.readline().split(';')[0], 16)
+                except ValueError:
+                    # Dropped before the last chunk, or garbage
+                    return
+                if not size:
+                    return
+                data = response.fp.read(size)
+                response.fp.read(2)
+            else:
+                data = response.fp.readline()
+            if not data:
+                return
+            yield data
+
+    def on_connect(self):
+        self.connected = True
+        self.connections += 1
+        self.backoff.reset()
+        logging.info('Stream connected')
+        # What was missed while the stream was down
+        if self.connections > 1:
+            for buff in self.buffers:
+                self.api.update_in_background(buff)
+
+    def dispatch(self, messages):
+        received = {}
+        for message in messages:
+            for buff, status in self.statuses(message):
+                received.setdefault(buff, []).append(status)
+        if not received:
+            return
+        # newest first, as the API gives them
+        with self.api.lock:
+            for buff, statuses in received.items():
+                statuses.reverse()
+                self.api.merge_statuses(self.timelines[buff], statuses)
+        for buff, statuses in received.items():
+            self.api.store_statuses(buff, statuses)
+        self.events.call(self.api.interface.display_timeline)
+
+    def statuses(self, message):
+        '''@return (buffer, status) of a message, nothing for friends lists,
+           deletions and events'''
+        if 'direct_message' in message:
+            return [('direct', DirectMessage.NewFromJsonDict(message['direct_message']))]
+        if 'text' in message and 'user' in message:
+            status = Status.NewFromJsonDict(message)
+            result = [('home', status)]
+            if self.is_mention(status.text):
+                result.append(('mentions', status))
+            return result
+        return []
+
+    def is_mention(self, text):
+        '''@nick as a whole, @nickname is someone else'''
+        if not self.conf.my_nick:
+            return False
+        mention = r'(?<!\w)@%s(?!\w)' % re.escape(self.conf.my_nick)
+        return re.search(mention, text, re.IGNORECASE) is not None
+
+    def stop(self):
+        self.stopped.set()
+        self.close()
+
+    def close(self):
+        conn = self.conn
+        if conn is not None and conn.sock is not None:
+            # Unblocks the thread waiting on the socket
+            try:
+                conn.sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+            conn.close()
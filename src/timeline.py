@@ -13,12 +13,40 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from filter import FilterStatus
+import time
+import tyrs
+import threading
+from collections import namedtuple
+from status import compact
+from utils import sizeof
+
+Snapshot = namedtuple('Snapshot', 'statuses current first')
 
 class Timeline(object):
+    '''
+    self.statuses     Statuses held, newest first, as compact records. The
+                      list is replaced, never modified in place, so a
+                      reference to it is a snapshot
+    self.positions    id -> sequence number of every status held, the
+                      position in self.statuses is sequence - self.head, so
+                      prepending does not shift the index
+    self.retention    max_statuses and max_age (hours) kept, 0 for no limit
+    self.lock         Held to change the statuses and the cursor (current,
+                      first), only for short sections, never for a request
+    '''
+
+    def __init__(self, buffer=None):
+        self.buffer = buffer
+        self.retention = tyrs.container['conf'].retention_policy(buffer)
+        self.filter = tyrs.container['filter']
+        self.status_cache = tyrs.container['status_cache']
+        self.lock = threading.RLock()
+        self.init_statuses()
 
-    def __init__(self):
+    def init_statuses(self):
         self.statuses = []
+        self.positions = {}
+        self.head = 0
         self.unread = 0
         self.count = 0
         self.last_read = 0
@@ -26,52 +54,131 @@ class Timeline(object):
         self.first = 0
         self.last = 0
         self.page = 1
-        self.filter = FilterStatus()
+        self.newest_id = None
+        self.oldest_id = None
+
+    def snapshot(self):
+        '''@return the statuses and the cursor, consistent with each other'''
+        with self.lock:
+            return Snapshot(self.statuses, self.current, self.first)
+
+    def current_status(self):
+        with self.lock:
+            return self.statuses[self.current]
 
     def append_new_statuses(self, retreive):
+        '''@return the number of statuses we did not hold yet'''
+        # The costly part is done before taking the lock
         retreive = self.filter_statuses(retreive)
+        retreive = self.unknown_statuses(retreive)
+        retreive = [compact(status) for status in retreive]
+        self.status_cache.add_all(retreive)
 
-        if retreive:
-            if len(self.statuses) == 0:
-                self.statuses = retreive
-            else:
-                current_id = self.statuses[self.current].id
-                for i, status in enumerate(self.statuses):
-                    if retreive[-1].id == status.id:
-                        try:
-                            self.statuses = retreive + self.statuses[i+1:]
-                            self.find_current(current_id)
-                        except IndexError:
-                            self.statuses = retreive
-            self.update_counter()
+        with self.lock:
+            # Another merge could have brought some of them meanwhile
+            retreive = self.unknown_statuses(retreive)
+            if retreive:
+                if len(self.statuses) == 0:
+                    self.statuses = retreive
+                    self.reindex()
+                else:
+                    current_id = self.statuses[self.current].id
+                    self.statuses = retreive + self.statuses
+                    self.head -= len(retreive)
+                    self.index(retreive, self.head)
+                    self.find_current(current_id)
+                self.update_ids(retreive)
+                self.evict()
+                self.update_counter()
+            return len(retreive)
 
-    def find_current(self, current_id):
-        for i, status in enumerate(self.statuses):
-            if status.id == current_id:
-                self.current = i
+    def unknown_statuses(self, statuses):
+        '''A refresh could return statuses we already hold (no since_id
+           for favorites, or a page shifted by new statuses)'''
+        return [status for status in statuses if status.id not in self.positions]
 
-    def filter_statuses(self, statuses):
-        filters = []
+    def index(self, statuses, start):
         for i, status in enumerate(statuses):
-            if self.filter.filter_status(status):
-                filters.append(i)
-        filters.reverse()
-        for f in filters:
-            del statuses[f]
+            self.positions[status.id] = start + i
+
+    def reindex(self):
+        self.head = 0
+        self.positions = {}
+        self.index(self.statuses, 0)
+
+    def position(self, id):
+        '''@return the position of the status in self.statuses, or None'''
+        try:
+            return self.positions[id] - self.head
+        except KeyError:
+            return None
+
+    def update_ids(self, statuses):
+        ids = [status.id for status in statuses]
+        if self.newest_id is None or max(ids) > self.newest_id:
+            self.newest_id = max(ids)
+        if self.oldest_id is None or min(ids) < self.oldest_id:
+            self.oldest_id = min(ids)
+
+    def evict(self):
+        '''Drop the oldest statuses out of the retention policy, but never
+           the ones on screen or above'''
+        keep = len(self.statuses)
+        max_statuses = self.retention['max_statuses']
+        if max_statuses and keep > max_statuses:
+            keep = max_statuses
+        max_age = self.retention['max_age']
+        if max_age:
+            limit = time.time() - max_age * 3600
+            while keep > 0 and 0 < self.statuses[keep-1].created_at_in_seconds < limit:
+                keep -= 1
+        keep = max(keep, self.current + 1, self.last + 1)
+
+        if keep < len(self.statuses):
+            for status in self.statuses[keep:]:
+                del self.positions[status.id]
+            self.statuses = self.statuses[:keep]
+            self.oldest_id = min([status.id for status in self.statuses])
 
-        return statuses
+    def memory_report(self):
+        size = sizeof(self.statuses)
+        count = len(self.statuses)
+        return '{0} statuses, {1} bytes, {2} bytes per status'.format(
+                count, size, size / max(count, 1))
+
+    def older_than(self):
+        '''@return the max_id to ask for statuses older than what we hold'''
+        if self.oldest_id:
+            return self.oldest_id - 1
+
+    def find_current(self, current_id):
+        position = self.position(current_id)
+        if position is not None:
+            self.current = position
+
+    def filter_statuses(self, statuses):
+        return self.filter.filter(statuses)
 
     def update_counter(self):
         self.count_statuses()
         self.count_unread()
 
     def append_old_statuses(self, statuses):
-        if statuses == []:
-            pass
-        else:
-            self.statuses += statuses
-            self.count_statuses()
-            self.count_unread()
+        '''@return the number of statuses we did not hold yet'''
+        statuses = self.unknown_statuses(statuses)
+        statuses = [compact(status) for status in statuses]
+        self.status_cache.add_all(statuses)
+        with self.lock:
+            statuses = self.unknown_statuses(statuses)
+            if statuses == []:
+                pass
+            else:
+                self.index(statuses, self.head + len(self.statuses))
+                self.statuses = self.statuses + statuses
+                self.update_ids(statuses)
+                self.count_statuses()
+                self.count_unread()
+            return len(statuses)
 
     def count_statuses(self):
         try:
@@ -80,21 +187,30 @@ class Timeline(object):
             self.count = 0
 
     def count_unread(self):
-        try:
-            self.unread = 0
-            for i in range(len(self.statuses)):
-                if self.statuses[i].id == self.last_read:
-                    break
-                self.unread += 1
-        except TypeError:
-            self.unread = 0
+        position = self.position(self.last_read)
+        if position is None:
+            self.unread = len(self.statuses)
+        else:
+            self.unread = position
+
+    def clear(self):
+        '''Only keep the newest status'''
+        with self.lock:
+            self.statuses = self.statuses[:1]
+            self.reindex()
+            self.oldest_id = self.newest_id = None
+            if self.statuses:
+                self.update_ids(self.statuses)
+            self.current = 0
+            self.count_statuses()
 
     def reset(self):
         self.first = 0
         self.unread = 0
 
     def empty(self):
-        self.__init__()
+        with self.lock:
+            self.init_statuses()
 
     def all_read(self):
         if self.count > 0:
@@ -14,14 +14,20 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import tyrs
+import time
 import logging
+import sqlite3
+import threading
 from urllib2 import URLError
 import oauth2 as oauth
 import urllib2
 from editor import *
 from utils import cut_attag
 from message import FlashMessage
-from twitter import Api, TwitterError, Status, _FileCache
+from connection import get_pool
+from store import TIMELINES as STORED_TIMELINES
+from cache import ResponseCache, cache_key, get_ttl
+from twitter import Api, TwitterError, Status, User
 from httplib import BadStatusLine
 
 try:
@@ -29,6 +35,22 @@ try:
 except ImportError:
     import simplejson as json
 
+# Statuses the API sends in a page, when there are more
+PAGE_SIZE = 20
+# Timelines the API pages through with max_id
+MAX_ID_TIMELINES = ('home', 'mentions', 'user_retweet', 'user')
+# Pages a refresh asks for at most to reach the statuses we hold, what is
+# older is loaded when scrolled to
+GAP_PAGES = 5
+
+# Seconds before the threads still being prefetched are given up, the
+# worker is wanted for what the user asks
+PREFETCH_TIMEOUT = 5
+
+# Requests kept in the outbox when they cannot be sent
+QUEUED_EVENTS = ('tweet', 'retweet', 'destroy', 'direct', 'follow', 'unfollow',
+                 'favorite', 'favorite_del')
+
 class Tweets(object):
 
     def __init__(self):
@@ -37,22 +59,86 @@ class Tweets(object):
         self.search_user = None
         self.search_word = None
         self.flash_message = FlashMessage()
+        self.workers = tyrs.container['workers']
+        self.events = tyrs.container['events']
+        self.rate_limit = tyrs.container['rate_limit']
+        self.status_cache = tyrs.container['status_cache']
+        self.store = tyrs.container['store']
+        self.outbox = tyrs.container['outbox']
+        # No network since the start, or since a request failed
+        self.offline = False
+        self.flushing = False
+        # First status of the chains being prefetched
+        self.prefetching = set()
+        # Replies waiting for the prefetch job, one runs at a time
+        self.prefetch_queue = []
+        self.prefetch_running = False
+        # Buffers getting their next page in the background
+        self.reading_ahead = set()
+        # Buffers being updated in the background
+        self.updating = set()
+        # Oldest id of the buffers with nothing older to read ahead
+        self.read_ahead_end = {}
+        # The status the thread buffer was opened on
+        self.thread_status = None
+        # Timelines are fetched in parallel, but merged one at a time
+        self.lock = threading.RLock()
 
     def set_interface(self):
         self.interface = tyrs.container['interface']
 
     def authentication(self):
+        self.init_api()
+        self.verify_credentials()
+
+    def init_api(self):
+        '''Requests can be signed at once, even before the credentials
+           are verified'''
         url = self.get_base_url()
-        proxify = self.get_proxy()
         self.api = ApiPatch(
             self.conf.token[self.conf.service]['consumer_key'],
             self.conf.token[self.conf.service]['consumer_secret'],
             self.conf.oauth_token,
             self.conf.oauth_token_secret,
             base_url=url,
-            proxy=proxify
+            rate_limit=self.rate_limit,
+            cache=self.get_cache(),
         )
-        self.set_myself()
+        # The nick of the last session until twitter tells
+        self.myself = User(screen_name=self.conf.load_my_nick() or '')
+        self.conf.my_nick = self.myself.screen_name
+
+    def verify_credentials(self):
+        try:
+            self.set_myself()
+        except URLError, e:
+            # The stored timelines are displayed, we will try again later
+            logging.error('Starting offline: {0}'.format(e))
+            self.offline = True
+
+    def first_update(self, timelines):
+        '''
+        The credentials are verified and the timelines retrieved in the
+        background, each one displayed as soon as it comes, the interface
+        is already drawn
+        '''
+        self.workers.submit(self.verify_in_background, None)
+        for timeline in timelines:
+            self.update_in_background(timeline, first=True)
+
+    def verify_in_background(self, unused):
+        try:
+            self.verify_credentials()
+        except TwitterError, e:
+            self.update_error(e)
+            return
+        self.events.call(self.interface.display_timeline)
+
+    def get_cache(self):
+        if not self.conf.params['cache_size']:
+            return None
+        return ResponseCache(self.conf.params['cache_size'],
+                             self.conf.params['cache_dir'] or None)
 
     def get_base_url(self):
         url = None
@@ -61,19 +147,12 @@ class Tweets(object):
 
         return url
 
-    def get_proxy(self):
-        proxy = self.conf.params['proxy']
-        if proxy:
-            return {
-                'http': 'http://{0}'.format(proxy),
-                'https': 'https://{0}'.format(proxy),
-            }
-        else:
-            return {}
-
     def set_myself(self):
         self.myself = self.api.VerifyCredentials()
         self.conf.my_nick = self.myself.screen_name
+        # Known when we start offline
+        if self.conf.load_my_nick() != self.conf.my_nick:
+            self.conf.save_my_nick(self.conf.my_nick)
 
     def tweet(self, data=None):
         tweet = TweetEditor(data).content
@@ -84,18 +163,12 @@ class Tweets(object):
 
     def post_tweet(self, tweet, reply_to=None):
         self.flash('tweet')
-        try:
-            return self.api.PostUpdate(tweet, reply_to)
-        except TwitterError, e:
-            self.error(e)
+        self.background('tweet', None, self.api.PostUpdate, tweet, reply_to)
 
     def retweet(self):
         self.flash('retweet')
         status = self.interface.current_status()
-        try:
-            self.api.PostRetweet(status.id)
-        except TwitterError, e:
-            self.error(e)
+        self.background('retweet', None, self.api.PostRetweet, status.id)
 
     def retweet_and_edit(self):
         status = self.interface.current_status()
@@ -117,10 +190,7 @@ class Tweets(object):
     def destroy(self):
         self.flash('destroy')
         status = self.interface.current_status()
-        try:
-            self.api.DestroyStatus(status.id)
-        except TwitterError, e:
-            self.error(e)
+        self.background('destroy', None, self.api.DestroyStatus, status.id)
 
     def direct_message(self):
         ''' Two editing box, one for the name, and one for the content'''
@@ -141,10 +211,7 @@ class Tweets(object):
 
     def send_direct_message(self, nick, tweet):
         self.flash('direct')
-        try:
-            return self.api.PostDirectMessage(nick, tweet)
-        except TwitterError, e:
-            self.error(e)
+        self.background('direct', None, self.api.PostDirectMessage, nick, tweet)
 
     def follow(self):
         nick = NickEditor().content
@@ -170,33 +237,149 @@ class Tweets(object):
 
     def create_friendship(self, nick):
         self.flash('follow', nick)
-        try:
-            self.api.CreateFriendship(nick)
-        except TwitterError, e:
-            self.error(e)
+        self.background('follow', nick, self.api.CreateFriendship, nick)
 
     def destroy_friendship(self, nick):
         self.flash('unfollow', nick)
+        self.background('unfollow', nick, self.api.DestroyFriendship, nick)
+
+    def get_user(self, nick):
+        '''The profile is shown once it came'''
+        self.workers.submit(self.show_user, nick)
+
+    def show_user(self, nick):
         try:
-            self.api.DestroyFriendship(nick)
-        except TwitterError, e:
-            self.error(e)
+            user = self.api.GetUser(nick)
+        except (TwitterError, URLError, BadStatusLine), e:
+            self.request_error('user', nick, e)
+            return
+        self.events.call(self.interface.display_user, user)
 
     def set_favorite(self):
         self.flash('favorite')
         status = self.interface.current_status()
-        try:
-            self.api.CreateFavorite(status)
-        except TwitterError, e:
-            self.error(e)
+        self.background('favorite', None, self.api.CreateFavorite, status)
 
     def destroy_favorite(self):
         self.flash('favorite_del')
         status = self.interface.current_status()
+        self.background('favorite_del', None, self.api.DestroyFavorite, status)
+
+    def background(self, event, string, func, *args):
+        '''
+        Send a request on the worker pool, the UI does not wait for it
+        @param event, string, the flash message to show if it fails
+        '''
+        # Offline, it would only wait for a timeout
+        if self.offline and self.queue(event, string, func, args):
+            return
+        self.workers.submit(self.run_request, (event, string, func, args))
+
+    def run_request(self, request):
+        event, string, func, args = request
         try:
-            self.api.DestroyFavorite(status)
-        except TwitterError, e:
-            self.error(e)
+            func(*args)
+        except (URLError, BadStatusLine), e:
+            if not self.queue(event, string, func, args):
+                self.request_error(event, string, e)
+        except (TwitterError, ValueError), e:
+            self.request_error(event, string, e)
+
+    def request_error(self, event, string, err):
+        logging.warning('Error catch: {0}'.format(err))
+        with self.lock:
+            self.flash(event, string)
+            self.flash_message.warning()
+        self.events.call(self.interface.display_flash_message)
+
+    def queue(self, event, string, func, args):
+        '''Keep the request in the outbox, to send it once online
+           @return False if it cannot wait'''
+        if self.outbox is None or event not in QUEUED_EVENTS:
+            return False
+        self.offline = True
+        try:
+            self.outbox.add(event, string, func.__name__, args)
+        except sqlite3.Error, e:
+            logging.error('Cannot queue "{0}": {1}'.format(event, e))
+            return False
+        logging.info('Offline, "{0}" queued'.format(event))
+        with self.lock:
+            self.flash_message.reset()
+            self.flash('offline')
+            self.flash_message.warning()
+        self.events.call(self.interface.display_flash_message)
+        return True
+
+    def back_online(self):
+        '''A request went through, send what was queued meanwhile'''
+        if not self.offline and (self.outbox is None or not len(self.outbox)):
+            return
+        with self.lock:
+            if self.flushing:
+                return
+            self.flushing = True
+        self.workers.submit(self.flush_outbox, self.outbox)
+
+    def flush_outbox(self, outbox):
+        sent = 0
+        try:
+            if self.offline:
+                self.set_myself()
+                self.offline = False
+            pending = outbox is not None and outbox.pending() or []
+            for id, event, string, method, args in pending:
+                try:
+                    getattr(self.api, method)(*args)
+                except (URLError, BadStatusLine), e:
+                    # Still offline, the next update will try again
+                    logging.info('Outbox not sent: {0}'.format(e))
+                    outbox.retry(id)
+                    self.offline = True
+                    break
+                except (TwitterError, ValueError), e:
+                    self.request_error(event, string, e)
+                else:
+                    sent += 1
+                outbox.remove(id)
+        except (URLError, BadStatusLine, TwitterError), e:
+            logging.info('Still offline: {0}'.format(e))
+        except sqlite3.Error, e:
+            logging.error('Cannot read the outbox: {0}'.format(e))
+        finally:
+            self.flushing = False
+        if sent:
+            with self.lock:
+                self.flash_message.reset()
+                self.flash('online', str(sent))
+            self.events.call(self.interface.display_flash_message)
+
+    def update_in_background(self, timeline, first=False):
+        '''
+        Displayed as soon as it is retrieved
+        @param first, statuses of an empty timeline are not shown as unread
+        '''
+        with self.lock:
+            if timeline in self.updating:
+                return
+            self.updating.add(timeline)
+        self.workers.submit(self.update_and_display, (timeline, first))
+
+    def update_and_display(self, update):
+        timeline, first = update
+        try:
+            empty = self.timelines[timeline].count == 0
+            count = self.update_timeline(timeline)
+            if first and empty:
+                with self.timelines[timeline].lock:
+                    self.timelines[timeline].all_read()
+                    self.timelines[timeline].unread = 0
+        finally:
+            self.updating.discard(timeline)
+        # An empty timeline is retrieved again when displayed, it would
+        # never end
+        if count:
+            self.events.call(self.interface.display_timeline)
 
     def get_favorites(self):
         self.interface.change_buffer('favorite')
@@ -205,15 +388,27 @@ class Tweets(object):
         '''
         Retrieves tweets, don't display them
         @param the buffer to retreive tweets
+        @return the number of new statuses, None if it failed
         '''
 
         logging.debug('updating "{0}" timeline'.format(timeline))
+        start = time.time()
         try:
-            statuses = self.retreive_statuses(timeline)
-            timeline = self.timelines[timeline]
-            timeline.append_new_statuses(statuses)
-            if timeline.unread and self.conf.params['beep']:
-                self.interface.beep()
+            since_id = self.timelines[timeline].newest_id
+            statuses = self.retreive_statuses(timeline, since_id=since_id)
+            closed = True
+            if since_id:
+                older, closed = self.fill_gap(timeline, since_id, statuses)
+                statuses = statuses + older
+            with self.lock:
+                if not closed:
+                    self.drop_held(timeline)
+                count = self.merge_statuses(self.timelines[timeline], statuses)
+            self.store_statuses(timeline, statuses)
+            self.back_online()
+            logging.debug('"{0}" timeline updated in {1:.3f}s'.format(
+                timeline, time.time() - start))
+            return count
 
         except TwitterError, e:
             self.update_error(e)
@@ -224,91 +419,363 @@ class Tweets(object):
         except URLError, e:
             self.update_error(e)
 
+    def fill_gap(self, timeline, since_id, statuses):
+        '''
+        After a long time away, the newest page does not reach the
+        statuses we hold, the pages in between are retrieved too or a hole
+        would be left in the timeline
+        @return the statuses older than the newest page, and if they reach
+                what we hold
+        '''
+        older = []
+        page = statuses
+        limit = self.gap_size(timeline)
+        while timeline in MAX_ID_TIMELINES and len(page) >= PAGE_SIZE:
+            if len(statuses) + len(older) >= limit or not self.rate_limit.allow():
+                return older, False
+            max_id = min(status.id for status in page) - 1
+            page = self.retreive_statuses(timeline, since_id=since_id,
+                    max_id=max_id)
+            older.extend(page)
+        return older, True
+
+    def gap_size(self, timeline):
+        '''@return the statuses worth retrieving at once, no more than
+           the timeline and the store keep'''
+        limits = [GAP_PAGES * PAGE_SIZE,
+                  self.timelines[timeline].retention['max_statuses']]
+        if self.store is not None and timeline in STORED_TIMELINES:
+            limits.append(self.conf.params['store_size'])
+        return min(limit for limit in limits if limit)
+
+    def drop_held(self, timeline):
+        '''What we hold is past a gap too long to fill, it goes, the older
+           statuses are retrieved again when scrolled to'''
+        logging.info('Gap in "{0}" timeline, older statuses dropped'.format(
+            timeline))
+        self.timelines[timeline].empty()
+        if self.store is None or timeline not in STORED_TIMELINES:
+            return
+        try:
+            self.store.clear(timeline)
+        except sqlite3.Error, e:
+            logging.error('Cannot clear "{0}" statuses: {1}'.format(timeline, e))
+
+    def update_timelines(self, timelines):
+        '''
+        Retrieves several timelines at once, don't display them
+        @param timelines, the buffers to retreive tweets
+        @return the number of new statuses of each buffer
+        '''
+        start = time.time()
+        counts = self.workers.map(self.update_timeline, timelines)
+        logging.debug('{0} timelines updated in {1:.3f}s'.format(
+            len(timelines), time.time() - start))
+        if self.api._cache is not None:
+            logging.debug(self.api._cache.report())
+        return dict(zip(timelines, counts))
+
+    def merge_statuses(self, timeline, statuses):
+        count = timeline.append_new_statuses(statuses)
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            logging.debug(timeline.memory_report())
+        if timeline.unread and self.conf.params['beep']:
+            self.events.call(self.interface.beep)
+        return count
+
+    def store_statuses(self, buffer, statuses):
+        '''Kept for the next session'''
+        if self.store is None or buffer not in STORED_TIMELINES:
+            return
+        try:
+            self.store.save(buffer, statuses)
+        except sqlite3.Error, e:
+            logging.error('Cannot store "{0}" statuses: {1}'.format(buffer, e))
+
     def update_error(self, err):
         logging.error('Updating issue: {0}'.format(err))
-        self.flash_message.event = 'update'
-        self.flash_message.level = 1
-        self.interface.display_flash_message()
+        with self.lock:
+            self.flash_message.event = 'update'
+            self.flash_message.level = 1
+        self.events.call(self.interface.display_flash_message)
 
-    def retreive_statuses(self, timeline, page=None):
-        self.interface.display_update_msg()
+    def retreive_statuses(self, timeline, page=None, since_id=None, max_id=None):
+        '''
+        @param since_id, only retrieve statuses newer than this one
+        @param max_id, only retrieve statuses older than this one, when the
+               api support it, page is used otherwise
+        '''
+        self.events.call(self.interface.display_update_msg)
+        statuses = []
         if timeline == 'home':
-            statuses = self.api.GetFriendsTimeline(retweets=True, page=page)
+            if max_id:
+                page = None
+            statuses = self.api.GetHomeTimeline(since_id=since_id,
+                    max_id=max_id, page=page)
         elif timeline == 'mentions':
-            statuses = self.api.GetMentions(page=page)
+            if max_id:
+                page = None
+            statuses = self.api.GetMentions(since_id=since_id, max_id=max_id,
+                    page=page)
         elif timeline == 'user_retweet':
-            statuses = self.api.GetUserRetweets()
+            statuses = self.api.GetUserRetweets(since_id=since_id,
+                    max_id=max_id)
         elif timeline == 'search' and self.search_word != '':
-            statuses = self.api.GetSearch(self.search_word, page=page)
+            statuses = self.api.GetSearch(self.search_word, since_id=since_id,
+                    page=page)
         elif timeline == 'direct':
-            statuses = self.api.GetDirectMessages(page=page)
+            statuses = self.api.GetDirectMessages(since_id=since_id, page=page)
         elif timeline == 'user' and self.search_user != '':
-            statuses = self.load_user_public_timeline(page=page)
+            statuses = self.load_user_public_timeline(page=page,
+                    since_id=since_id, max_id=max_id)
         elif timeline == 'favorite':
             statuses = self.api.GetFavorites(page=page)
         elif timeline == 'thread':
-            statuses = self.get_thread()
-        self.interface.erase_flash_message()
+            # The whole thread is there, nothing older to page through
+            statuses = [] if max_id else self.thread_statuses()
+        self.events.call(self.interface.erase_flash_message)
 
         return statuses
 
+    def load_older(self, buffer):
+        '''Append the next page of older statuses to the timeline
+           @return the number of statuses added'''
+        timeline = self.timelines[buffer]
+        page = timeline.page + 1
+        statuses = self.retreive_statuses(buffer, page,
+                max_id=timeline.older_than())
+        with self.lock:
+            timeline.page = page
+            count = timeline.append_old_statuses(statuses)
+        self.store_statuses(buffer, statuses)
+        return count
+
+    def load_older_in_background(self, buffer):
+        '''The user reached the end of the timeline, the cursor moves on
+           once the page came'''
+        with self.lock:
+            if buffer in self.reading_ahead:
+                return
+            self.reading_ahead.add(buffer)
+        self.workers.submit(self.load_older_and_display, buffer)
+
+    def load_older_and_display(self, buffer):
+        try:
+            count = self.load_older(buffer)
+        except (TwitterError, URLError, BadStatusLine, ValueError), e:
+            self.update_error(e)
+            return
+        finally:
+            self.reading_ahead.discard(buffer)
+        if count:
+            self.events.call(self.interface.older_loaded, buffer)
+
+    def open_buffer(self, buffer):
+        '''
+        Retrieve the statuses of the buffer in the background, it is
+        shown once they came
+        '''
+        with self.lock:
+            if buffer in self.updating:
+                return
+            self.updating.add(buffer)
+        self.workers.submit(self.fill_and_display, buffer)
+
+    def fill_and_display(self, buffer):
+        try:
+            statuses = self.retreive_statuses(buffer)
+        except (TwitterError, URLError, BadStatusLine, ValueError), e:
+            self.update_error(e)
+            return
+        finally:
+            self.updating.discard(buffer)
+        timeline = self.timelines[buffer]
+        with self.lock:
+            with timeline.lock:
+                timeline.empty()
+                timeline.append_new_statuses(statuses)
+        self.events.call(self.interface.change_buffer, buffer)
+
+    def read_ahead(self, buffer):
+        '''Get the next page in the background, before the user reaches
+           the end of the timeline'''
+        if buffer == 'thread' or buffer in self.reading_ahead:
+            return
+        if self.read_ahead_end.get(buffer) == self.timelines[buffer].oldest_id:
+            return
+        self.reading_ahead.add(buffer)
+        self.workers.submit(self.read_ahead_page, buffer)
+
+    def read_ahead_page(self, buffer):
+        try:
+            if self.rate_limit.allow():
+                oldest_id = self.timelines[buffer].oldest_id
+                if not self.load_older(buffer):
+                    self.read_ahead_end[buffer] = oldest_id
+        except (TwitterError, URLError, BadStatusLine, ValueError), e:
+            logging.warning('Read ahead of "{0}" failed: {1}'.format(buffer, e))
+        finally:
+            self.reading_ahead.discard(buffer)
+
     def find_public_timeline(self):
         nick = NickEditor().content
         if nick and nick != self.search_user:
             self.change_search_user(nick)
-            self.load_user_public_timeline()
-            self.interface.change_buffer('user')
 
     def find_current_public_timeline(self):
         self.change_search_user(self.interface.current_status().user.screen_name)
-        self.load_user_public_timeline()
-        self.interface.change_buffer('user')
 
     def change_search_user(self, nick):
+        '''The user buffer is replaced once the statuses of nick came'''
         self.search_user = nick
-        self.timelines['user'].empty()
+        self.open_buffer('user')
 
     def my_public_timeline(self):
         self.change_search_user(self.myself.screen_name)
-        self.load_user_public_timeline()
 
-    def load_user_public_timeline(self, page=None):
+    def load_user_public_timeline(self, page=None, since_id=None, max_id=None):
         if self.search_user:
+            if max_id:
+                page = None
             return self.api.GetUserTimeline(self.search_user,
-                    include_rts=True, page=page)
+                    include_rts=True, page=page, since_id=since_id,
+                    max_id=max_id)
         else:
             return []
 
     def get_thread(self):
         try:
-            status = self.interface.current_status()
-            self.timelines['thread'].empty()
-            self.statuses = [status]
-            self.build_thread(status)
-            self.timelines['thread'].append_new_statuses(self.statuses)
-            self.interface.change_buffer('thread')
+            self.thread_status = self.interface.current_status()
         except IndexError:
+            return
+        self.open_buffer('thread')
+
+    def thread_statuses(self):
+        '''@return the status the thread was opened on, with what it
+           replies to'''
+        if self.thread_status is None:
             return []
+        return [self.thread_status] + self.build_thread(self.thread_status)
 
     def build_thread(self, status):
-        if status.in_reply_to_status_id:
+        '''@return the statuses status replies to, the closest first, as far
+           as they could be found'''
+        statuses = []
+        seen = set([status.id])
+        reply_to = getattr(status, 'in_reply_to_status_id', None)
+        while reply_to and reply_to not in seen:
+            status = self.get_status(reply_to, self.can_request)
+            if status is None:
+                break
+            statuses.append(status)
+            seen.add(reply_to)
+            reply_to = status.in_reply_to_status_id
+        return statuses
+
+    def get_status(self, id, can_request):
+        '''Statuses we already hold are not asked for again
+           @param can_request, tells if we may send a request when missing
+           @return the status, or None'''
+        status = self.status_cache.get(id)
+        if status is None and can_request():
             try:
-                reply_to = self.api.GetStatus(status.in_reply_to_status_id)
-                self.statuses.append(reply_to)
-                self.build_thread(reply_to)
-            except TwitterError:
-                pass
+                status = self.status_cache.add(self.api.GetStatus(id))
+            except (TwitterError, URLError, ValueError), e:
+                logging.warning('Could not get status {0}: {1}'.format(id, e))
+        return status
+
+    def prefetch_threads(self, statuses):
+        '''Get what the replies reply to in the background, so opening
+           their thread is immediate'''
+        if not self.conf.params['thread_prefetch']:
+            return
+        with self.lock:
+            for status in statuses:
+                reply_to = getattr(status, 'in_reply_to_status_id', None)
+                if not reply_to or reply_to in self.status_cache:
+                    continue
+                if status.id in self.prefetching:
+                    continue
+                self.prefetching.add(status.id)
+                self.prefetch_queue.append(status)
+            if not self.prefetch_queue or self.prefetch_running:
+                return
+            self.prefetch_running = True
+        self.workers.submit(self.prefetch_parents, None)
+
+    def prefetch_parents(self, unused):
+        '''A single job, the replies shown while it runs are walked next'''
+        try:
+            while True:
+                with self.lock:
+                    replies, self.prefetch_queue = self.prefetch_queue, []
+                    if not replies:
+                        self.prefetch_running = False
+                        return
+                self.walk_threads(replies)
+        finally:
+            self.prefetch_running = False
+
+    def walk_threads(self, replies):
+        '''The threads are walked at once, from this worker'''
+        client = self.get_async_api()
+        try:
+            for status in replies:
+                self.walk_thread(client, status.in_reply_to_status_id,
+                        self.conf.params['thread_prefetch'])
+            client.run(PREFETCH_TIMEOUT)
+        finally:
+            for status in replies:
+                self.prefetching.discard(status.id)
+
+    def walk_thread(self, client, reply_to, depth):
+        '''Ask for the next status of the thread we do not hold, the
+           one after once it came, depth statuses at most'''
+        while reply_to and depth:
+            status = self.status_cache.get(reply_to)
+            if status is None:
+                break
+            reply_to = status.in_reply_to_status_id
+            depth -= 1
+        if not reply_to or not depth or not self.rate_limit.allow():
+            return
+
+        def walk_on(result):
+            try:
+                status = self.status_cache.add(result.get())
+            except (TwitterError, URLError, ValueError), e:
+                logging.warning('Could not get status {0}: {1}'.format(reply_to, e))
+                return
+            self.walk_thread(client, status.in_reply_to_status_id, depth - 1)
+        client.GetStatus(reply_to).add_callback(walk_on)
+
+    def get_async_api(self):
+        '''@return a client for a batch of requests, run by the thread
+           asking'''
+        from asyncapi import AsyncApi
+        return AsyncApi(self.api, rate_limit=self.rate_limit,
+                        proxy=self.conf.params['proxy'])
 
     def search(self):
         self.search_word = SearchEditor().content
+        if not self.search_word:
+            return
         self.flash('search', self.search_word)
-        self.timelines['search'].empty()
-        try:
-            self.timelines['search'].append_new_statuses(self.api.GetSearch(self.search_word))
-            self.interface.change_buffer('search')
-        except TwitterError, e:
-            self.error(e)
-
+        if not self.can_request():
+            return
+        self.open_buffer('search')
+
+    def can_request(self):
+        '''What the user asks for may use the whole API budget, it is
+           only refused once nothing is left'''
+        if self.rate_limit.allow(interactive=True):
+            return True
+        # Also asked from the workers, walking a thread
+        with self.lock:
+            self.flash('rate_limit', str(int(self.rate_limit.wait() / 60) + 1))
+            self.flash_message.warning()
+        self.events.call(self.interface.display_flash_message)
+        return False
 
     def flash(self, event, string=None):
         self.flash_message.event = event
@@ -335,7 +802,8 @@ class ApiPatch(Api):
                  base_url=None,
                  use_gzip_compression=False,
                  debugHTTP=False,
-                 proxy={}
+                 pool=None,
+                 rate_limit=None
                 ):
 
 
@@ -346,7 +814,8 @@ class ApiPatch(Api):
       self._use_gzip       = use_gzip_compression
       self._debugHTTP      = debugHTTP
       self._oauth_consumer = None
-      self._proxy = proxy
+      self._pool = pool or get_pool()
+      self._rate_limit = rate_limit
 
       self._InitializeRequestHeaders(request_headers)
       self._InitializeUserAgent()
@@ -374,6 +843,35 @@ class ApiPatch(Api):
                 no_cache=None,
                 use_gzip_compression=None):
 
+      ttl = 0
+      if self._cache is not None and not post_data and not no_cache:
+        ttl = get_ttl(url)
+
+      url, encoded_post_data, headers = self._SignRequest(url, post_data,
+          parameters, use_gzip_compression)
+
+      if ttl:
+        key = cache_key(url)
+        data = self._cache.get(key, ttl)
+        if data is not None:
+          return data
+
+      # Connections are kept alive by the pool, no handshake for each call
+      response = self._pool.request(url, encoded_post_data, headers)
+      if self._rate_limit is not None:
+        self._rate_limit.update(response.headers)
+
+      if ttl and response.status == 200:
+        self._cache.Set(key, response.data)
+      return response.data
+
+    def _SignRequest(self,
+                url,
+                post_data=None,
+                parameters=None,
+                use_gzip_compression=None):
+      '''@return the url, the encoded body and the headers of a request,
+         signed when authenticated, the asynchronous client signs with it too'''
 
     # Build the extra parameters dict
       extra_params = {}
@@ -387,21 +885,7 @@ class ApiPatch(Api):
       else:
         http_method = "GET"
 
-      if self._debugHTTP:
-        _debug = 1
-      else:
-        _debug = 0
-
-      http_handler  = self._urllib.HTTPHandler(debuglevel=_debug)
-      https_handler = self._urllib.HTTPSHandler(debuglevel=_debug)
-      proxy_handler = self._urllib.ProxyHandler(self._proxy)
-
-      opener = self._urllib.OpenerDirector()
-      opener.add_handler(http_handler)
-      opener.add_handler(https_handler)
-
-      if self._proxy:
-          opener.add_handler(proxy_handler)
+      headers = dict(self._request_headers)
 
       if use_gzip_compression is None:
         use_gzip = self._use_gzip
@@ -410,7 +894,7 @@ class ApiPatch(Api):
 
     # Set up compression
       if use_gzip and not post_data:
-        opener.addheaders.append(('Accept-Encoding', 'gzip'))
+        headers['Accept-Encoding'] = 'gzip'
 
       if self._oauth_consumer is not None:
         if post_data and http_method == "POST":
@@ -423,8 +907,6 @@ class ApiPatch(Api):
 
         req.sign_request(self._signature_method_hmac_sha1, self._oauth_consumer, self._oauth_token)
 
-        headers = req.to_header()
-
         if http_method == "POST":
           encoded_post_data = req.to_postdata()
         else:
@@ -434,37 +916,7 @@ class ApiPatch(Api):
         url = self._BuildUrl(url, extra_params=extra_params)
         encoded_post_data = self._EncodePostData(post_data)
 
-      # Open and return the URL immediately if we're not going to cache
-      if encoded_post_data or no_cache or not self._cache or not self._cache_timeout:
-        response = opener.open(url, encoded_post_data)
-        url_data = self._DecompressGzippedResponse(response)
-        opener.close()
-      else:
-      # Unique keys are a combination of the url and the oAuth Consumer Key
-        if self._consumer_key:
-          key = self._consumer_key + ':' + url
-        else:
-          key = url
-
-      #TODO I turn off the cache as it bugged all the app,
-      #but I need to see what's wrong with that.
-      # See if it has been cached before
-      #last_cached = self._cache.GetCachedTime(key)
-
-      # If the cached version is outdated then fetch another and store it
-      #if not last_cached or time.time() >= last_cached + self._cache_timeout:
-        try:
-          response = opener.open(url, encoded_post_data)
-          url_data = self._DecompressGzippedResponse(response)
-        #self._cache.Set(key, url_data)
-        except urllib2.HTTPError, e:
-          print e
-        opener.close()
-    #else:
-      #url_data = self._cache.Get(key)
-
-    # Always return the latest version
-      return url_data
+      return url, encoded_post_data, headers
 
     def PostRetweet(self, id):
         '''This code come from issue #130 on python-twitter tracker'''
@@ -482,12 +934,30 @@ class ApiPatch(Api):
         self._CheckForTwitterError(data)
         return Status.NewFromJsonDict(data)
 
+    def GetHomeTimeline(self, count=None, since_id=None, max_id=None, page=None):
+        '''Like GetFriendsTimeline, with native retweets and max_id to page
+        through older statuses without overlap'''
+
+        if not self._oauth_consumer:
+            raise TwitterError("The twitter.Api instance must be authenticated.")
+        url = '%s/statuses/home_timeline.json' % self.base_url
+        parameters = {}
+        if count:
+            parameters['count'] = count
+        if since_id:
+            parameters['since_id'] = since_id
+        if max_id:
+            parameters['max_id'] = max_id
+        if page:
+            parameters['page'] = page
+        json_data = self._FetchUrl(url, parameters=parameters)
+        data = self._ParseAndCheckTwitter(json_data)
+        return [Status.NewFromJsonDict(x) for x in data]
+
     def GetCachedTime(self,key):
-        path = self._GetPath(key)
-        if os.path.exists(path):
-            return os.path.getmtime(path)
-        else:
+        if self._cache is None:
             return None
+        return self._cache.GetCachedTime(key)
 
     def SetCache(self, cache):
         '''Override the default cache.  Set to None to prevent caching.
@@ -497,6 +967,6 @@ class ApiPatch(Api):
             An instance that supports the same API as the twitter._FileCache
         '''
         if cache == DEFAULT_CACHE:
-            self._cache = _FileCache()
+            self._cache = ResponseCache()
         else:
             self._cache = cache
@@ -24,18 +24,26 @@
 
 '''
 
-import sys
+import logging
 import utils
 import config
 import locale
-import tweets
+import sqlite3
 import argparse
 import gettext
+import connection
 import curses.wrapper
-from urllib2 import URLError
 from keys import Keys
+from filter import FilterStatus
 from timeline import Timeline
+from status import StatusCache
 from update import UpdateThread
+from store import StatusStore, TIMELINES as STORED_TIMELINES
+from outbox import Outbox
+from session import Session
+from workers import WorkerPool
+from events import EventQueue
+from ratelimit import RateLimit
 from container import Container
 from interface import Interface
 
@@ -65,6 +73,13 @@ def main():
 
 def init_tyrs():
     init_timelines()
+    init_store()
+    init_session()
+    init_pool()
+    init_events()
+    init_workers()
+    init_rate_limit()
+    init_outbox()
     init_api()
     init_interface()
     init_thread()
@@ -72,16 +87,46 @@ def init_tyrs():
 def init_conf():
     conf = config.Config(arguments())
     container.add('conf', conf)
+    container.add('filter', FilterStatus())
+    container.add('status_cache', StatusCache())
+
+def init_pool():
+    conf = container['conf']
+    pool = connection.ConnectionPool(
+        size=conf.params['pool_size'],
+        timeout=conf.params['pool_timeout'],
+        proxy=conf.params['proxy']
+    )
+    connection.set_pool(pool)
+    container.add('pool', pool)
+
+def init_events():
+    container.add('events', EventQueue())
 
+def init_workers():
+    workers = WorkerPool(container['conf'].params['workers'])
+    container.add('workers', workers)
+
+def init_rate_limit():
+    rate_limit = RateLimit(container['conf'].params['rate_reserve'])
+    container.add('rate_limit', rate_limit)
+
+def init_outbox():
+    conf = container['conf']
+    try:
+        outbox = Outbox(conf.outbox_file)
+    except sqlite3.Error, e:
+        logging.error('Cannot open {0}: {1}'.format(conf.outbox_file, e))
+        outbox = None
+    container.add('outbox', outbox)
 
 def init_api():
+    # python-twitter and oauth2 are the slowest modules to import
+    import tweets
     api = tweets.Tweets()
     container.add('api', api)
-    try:
-        api.authentication()
-    except URLError, e:
-        print 'error:%s' % e
-        sys.exit(1)
+    # The credentials are verified once the interface is drawn
+    api.init_api()
 
 def init_interface():
     user_interface = Interface()
@@ -94,16 +139,57 @@ def init_timelines():
     )
     timelines = {}
     for buff in buffers:
-        timelines[buff] = Timeline()
+        timelines[buff] = Timeline(buff)
     container.add('timelines', timelines)
     container.add('buffers', buffers)
 
+def init_store():
+    conf = container['conf']
+    store = None
+    if conf.params['store']:
+        try:
+            store = StatusStore(conf.store_file, conf.params['store_size'])
+            for buff in STORED_TIMELINES:
+                container['timelines'][buff].append_new_statuses(store.load(buff))
+        except sqlite3.Error, e:
+            logging.error('Cannot open {0}: {1}'.format(conf.store_file, e))
+            store = None
+    container.add('store', store)
+
+def init_session():
+    conf = container['conf']
+    session = Session(conf.session_file)
+    # Was kept in the token file before
+    if session.get('last_read') is None:
+        last_read = conf.load_last_read()
+        if last_read:
+            session.set('last_read', last_read)
+    container.add('session', session)
+
 def init_thread():
-    update = UpdateThread()
+    stream = init_stream()
+    update = UpdateThread(stream)
     update.start()
     init_keys()
     update.stop()
+    if stream is not None:
+        stream.stop()
     container['interface'].tear_down()
+    if container['store'] is not None:
+        container['store'].close()
+    if container['outbox'] is not None:
+        container['outbox'].close()
+    logging.info(container['events'].latency.report())
+
+def init_stream():
+    params = container['conf'].params
+    if not params['stream'] or container['conf'].service != 'twitter':
+        return None
+    # Most do not use it, not imported before
+    from stream import StreamThread
+    stream = StreamThread(params['stream_url'])
+    stream.start()
+    return stream
 
 def init_keys():
     Keys().handleKeyBinding()
@@ -14,42 +14,171 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import tyrs
+import time
+import heapq
 import logging
 import threading
-import time
+
+# Number of new statuses an update should bring, the interval of each
+# timeline follows its activity to get close to it
+TARGET_STATUSES = 5
 
 class UpdateThread(threading.Thread):
     '''
-    The only thread that update all timelines
+    The only thread that update all timelines. It sleeps until the next
+    timeline is due, or until it is stopped, and refreshes every timeline
+    at its own interval.
+
+    self.intervals    Seconds between two updates of each timeline
+    self.jobs         Heap of (due time, timeline)
+    self.rates        Smoothed new statuses per second of each timeline
+    self.last_update  When each timeline was last updated
+    self.stream       StreamThread, its timelines are not polled while
+                      it is connected, or None
     '''
-    def __init__(self):
+    def __init__(self, stream=None):
         self.interface = tyrs.container['interface']
         self.conf = tyrs.container['conf']
         self.api = tyrs.container['api']
+        self.events = tyrs.container['events']
+        self.rate_limit = tyrs.container['rate_limit']
+        self.stream = stream
         threading.Thread.__init__(self, target=self.run)
-        self._stopevent = threading.Event()
+        self.condition = threading.Condition()
+        self.stopped = False
+        self.intervals = dict((buff, minutes * 60)
+                for buff, minutes in self.conf.refresh.items() if minutes > 0)
+        self.jobs = []
+        self.rates = {}
+        self.last_update = {}
+        self.schedule_all()
 
     def run(self):
         logging.info('Thread started')
-        for i in range(self.conf.params['refresh'] * 60):
-            time.sleep(1)
-            if self._stopevent.isSet() or self.interface.stoped:
-                logging.info('Thread forced to stop')
-                return
-        self.start_new_thread()
-        self.update_timeline()
+        while True:
+            due = self.wait_for_jobs()
+            if due is None:
+                break
+            if not self.rate_limit.allow():
+                self.postpone(due)
+                continue
+            counts = self.update_timeline(due)
+            for buff in due:
+                self.schedule(buff, self.next_interval(buff, counts.get(buff)))
         logging.info('Thread stoped')
-        self.stop()
+
+    def wait_for_jobs(self):
+        '''@return the timelines due, or None once stopped'''
+        with self.condition:
+            while not self.is_stopped():
+                now = time.time()
+                if self.jobs and self.jobs[0][0] <= now:
+                    due = []
+                    while self.jobs and self.jobs[0][0] <= now:
+                        due.append(heapq.heappop(self.jobs)[1])
+                    return due
+                timeout = None
+                if self.jobs:
+                    timeout = self.jobs[0][0] - now
+                self.condition.wait(timeout)
+
+    def is_stopped(self):
+        return self.stopped or self.interface.stoped
+
+    def schedule_all(self):
+        with self.condition:
+            self.jobs = []
+            for buff, interval in self.intervals.items():
+                heapq.heappush(self.jobs, (time.time() + interval, buff))
+            self.condition.notify()
+
+    def schedule(self, buff, delay):
+        '''Update buff in delay seconds, sooner if it was already due'''
+        with self.condition:
+            due = time.time() + delay
+            for when, job in self.jobs:
+                if job == buff:
+                    if when <= due:
+                        return
+                    self.jobs.remove((when, job))
+                    heapq.heapify(self.jobs)
+                    break
+            heapq.heappush(self.jobs, (due, buff))
+            self.condition.notify()
+
+    def postpone(self, due):
+        '''What is left of the budget is kept for the user, wait for the
+           next window'''
+        wait = self.rate_limit.wait() + 1
+        logging.info('Rate limit reached, updates postponed for {0:.0f}s'.format(wait))
+        for buff in due:
+            self.schedule(buff, max(wait, self.intervals[buff]))
 
     def stop(self):
-        self._stopevent.set()
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+
+    def update_timeline(self, due):
+        '''@return the number of new statuses of each timeline updated'''
+        # Search and user timelines are only followed once loaded
+        active = [buff for buff in due if self.is_active(buff)]
+        if not active:
+            return {}
+        counts = self.api.update_timelines(active)
+        self.events.call(self.interface.display_timeline)
+        return counts
+
+    def next_interval(self, buff, count):
+        '''
+        Quiet timelines are updated less and less often, busy ones more
+        often, within refresh_min and refresh_max, and never more than the
+        rate budget allows
+        @param count, new statuses of the last update, None when it failed
+        '''
+        params = self.conf.params
+        interval = self.intervals[buff]
+        if count is None or not params['refresh_adaptive']:
+            return interval
+
+        now = time.time()
+        elapsed = now - self.last_update.get(buff, now - interval)
+        self.last_update[buff] = now
+        rate = count / max(elapsed, 1.)
+        if buff in self.rates:
+            rate = (self.rates[buff] + rate) / 2
+        self.rates[buff] = rate
+
+        if rate > 0:
+            interval = TARGET_STATUSES / rate
+        else:
+            interval *= 2
+        interval = max(interval, params['refresh_min'] * 60)
+        interval = min(interval, params['refresh_max'] * 60)
+        interval = max(interval, self.budget_interval())
+        self.intervals[buff] = interval
+        logging.debug('"{0}" timeline: {1} new, next update in {2:.0f}s'.format(
+            buff, count, interval))
+        return interval
 
-    def start_new_thread(self):
-        update = UpdateThread()
-        update.start()
+    def budget_interval(self):
+        '''@return the shortest interval keeping all the timelines within
+           rate_budget requests an hour, and within what the API has left'''
+        budget = self.conf.params['rate_budget']
+        left = self.rate_limit.hourly_budget()
+        if left is not None:
+            if left < 1:
+                return self.rate_limit.wait()
+            budget = budget and min(budget, left) or left
+        if not budget:
+            return 0
+        return len(self.intervals) * 3600. / budget
 
-    def update_timeline(self):
-        timeline = ('home', 'mentions', 'direct')
-        for t in timeline:
-            self.api.update_timeline(t)
-        self.interface.display_timeline()
+    def is_active(self, buff):
+        if self.stream is not None and self.stream.covers(buff):
+            return False
+        if buff == 'search':
+            return bool(self.api.search_word)
+        if buff == 'user':
+            return bool(self.api.search_user)
+        return True
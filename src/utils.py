@@ -64,5 +64,27 @@ def open_image(user):
     os.system(command % image)
 
 
+def sizeof(obj, seen=None):
+    '''Approximate the memory held by an object and all it refers to'''
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.iteritems():
+            size += sizeof(key, seen) + sizeof(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += sizeof(item, seen)
+    if hasattr(obj, '__dict__'):
+        size += sizeof(obj.__dict__, seen)
+    for slot in getattr(type(obj), '__slots__', ()):
+        size += sizeof(getattr(obj, slot, None), seen)
+    return size
+
+URL_REGEX = re.compile('http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\(\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+')
+
 def get_urls(text):
-    return re.findall('http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\(\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', text)
+    return URL_REGEX.findall(text)
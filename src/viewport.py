@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2011 Nicolas Paris <nicolas.caen@gmail.com>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+'''
+The part of a timeline that fits on the screen. Only the heights of the
+statuses around the visible slice are asked for, so drawing, paging or
+jumping costs the same whether the timeline holds fifty statuses or fifty
+thousand.
+'''
+
+class Viewport(object):
+    '''
+    self.top        First line the statuses are drawn on
+    self.bottom     Line a status must end before
+    self.height     Function returning the height of a status, from the
+                    layout cache of the interface
+    self.overlap    Lines two following statuses share (compact display)
+    '''
+    def __init__(self, top, bottom, height, overlap=0):
+        self.top = top
+        self.bottom = bottom
+        self.height = height
+        self.overlap = overlap
+
+    def last(self, statuses, first):
+        '''@return the index of the last status fitting from first, first
+           itself when not even one fits'''
+        y = self.top
+        i = first
+        while i < len(statuses):
+            height = self.height(statuses[i])
+            if y + height > self.bottom:
+                break
+            y += height - self.overlap
+            i += 1
+        return max(first, i - 1)
+
+    def first(self, statuses, last):
+        '''@return the index of the first status to draw so the screen ends
+           with the status last'''
+        y = self.bottom
+        i = last
+        while i >= 0:
+            height = self.height(statuses[i])
+            if y - height < self.top:
+                break
+            y -= height - self.overlap
+            i -= 1
+        return min(last, i + 1)
+
+    def scroll_to(self, statuses, first, index):
+        '''@return the first status to draw so index is on screen, moving
+           as little as possible from first'''
+        if index < first:
+            return index
+        if index > self.last(statuses, first):
+            return self.first(statuses, index)
+        return first
+
+    def page_down(self, statuses, first):
+        '''@return the first status of the next page'''
+        return min(self.last(statuses, first) + 1, len(statuses) - 1)
+
+    def page_up(self, statuses, first):
+        '''@return the first status of the previous page'''
+        if first <= 0:
+            return 0
+        return self.first(statuses, first - 1)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2011 Nicolas Paris <nicolas.caen@gmail.com>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import Queue
+import logging
+import threading
+
+class WorkerPool(object):
+    '''
+    A few long lived threads running jobs, so several requests to twitter
+    can wait for their answer at the same time.
+
+    self.size       Number of threads, they are started with the first job
+    '''
+    def __init__(self, size=4):
+        self.size = max(1, size)
+        self._jobs = Queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def map(self, func, items):
+        '''Call func on every item in parallel, and wait for all of them
+           @return the results in the order of items, None for a call
+                   that raised
+        '''
+        items = list(items)
+        results = [None] * len(items)
+        done = threading.Semaphore(0)
+        self.start()
+        for i, item in enumerate(items):
+            self._jobs.put((func, item, results, i, done))
+        for item in items:
+            done.acquire()
+        return results
+
+    def submit(self, func, item):
+        '''Call func on item in the background, without waiting for it'''
+        self.start()
+        self._jobs.put((func, item, None, None, None))
+
+    def start(self):
+        with self._lock:
+            while len(self._threads) < self.size:
+                thread = threading.Thread(target=self.work)
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+    def work(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            func, item, results, i, done = job
+            try:
+                result = func(item)
+                if results is not None:
+                    results[i] = result
+            except Exception:
+                logging.exception('Worker failed on {0}'.format(item))
+            finally:
+                if done is not None:
+                    done.release()
+
+    def close(self):
+        with self._lock:
+            for thread in self._threads:
+                self._jobs.put(None)
+            self._threads = []
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2011 Nicolas Paris <nicolas.caen@gmail.com>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+'''
+What the tests of Tweets and the timelines share: a configuration, an
+interface drawing nothing, and the container they are built from. Imported
+once '../src' is in the path.
+
+Budgets in seconds depend on the machine, they only run with
+TYRS_BENCHMARK=1 in the environment.
+'''
+
+import os
+import time
+import unittest
+import tyrs
+import constant
+from timeline import Timeline
+from workers import WorkerPool
+from ratelimit import RateLimit
+from events import EventQueue
+from filter import FilterStatus
+from status import StatusCache
+
+benchmark = unittest.skipUnless(os.environ.get('TYRS_BENCHMARK'),
+        'timing budget, set TYRS_BENCHMARK=1 to run')
+
+def wait_for(condition, timeout=5):
+    '''@return if condition() came true before timeout seconds'''
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+class FakeConf(object):
+    filter = constant.filter
+    params = constant.params
+    my_nick = 'tyrs'
+
+    def retention_policy(self, buff):
+        return {'max_statuses': 0, 'max_age': 0}
+
+class FakeInterface(object):
+    '''Counts the timelines displayed'''
+    stoped = False
+
+    def __init__(self):
+        self.displayed = 0
+
+    def display_timeline(self):
+        self.displayed += 1
+
+    def display_update_msg(self):
+        pass
+
+    def erase_flash_message(self):
+        pass
+
+    def display_flash_message(self):
+        pass
+
+def setup_statuses(conf=None):
+    '''What a Timeline needs'''
+    tyrs.container.add('conf', conf or FakeConf())
+    tyrs.container.add('filter', FilterStatus())
+    tyrs.container.add('status_cache', StatusCache())
+
+def setup_container(conf=None, timelines=('home',), workers=2, store=None,
+                    outbox=None):
+    '''
+    What Tweets needs, the workers are to be closed by the test
+    @param timelines, the buffers to create empty timelines for
+    '''
+    setup_statuses(conf)
+    tyrs.container.add('timelines',
+            dict((buff, Timeline(buff)) for buff in timelines))
+    tyrs.container.add('workers', WorkerPool(workers))
+    tyrs.container.add('rate_limit', RateLimit())
+    tyrs.container.add('events', EventQueue())
+    tyrs.container.add('store', store)
+    tyrs.container.add('outbox', outbox)
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2011 Nicolas Paris <nicolas.caen@gmail.com>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import unittest
+import sys
+import json
+import time
+import threading
+import SocketServer
+import BaseHTTPServer
+import gettext
+from urllib2 import URLError
+gettext.install('tyrs', unicode=1)
+
+sys.path.insert(0, '../src')
+import helpers
+from twitter import TwitterError
+from tweets import ApiPatch
+from asyncapi import AsyncApi
+from ratelimit import RateLimit
+
+class SlowServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+class SlowHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    '''Each response takes delay seconds, while we count requests at once'''
+    delay = 0.2
+    lock = threading.Lock()
+    running = 0
+    most = 0
+    paths = []
+
+    def do_GET(self):
+        self.paths.append(self.path)
+        with self.lock:
+            SlowHandler.running += 1
+            SlowHandler.most = max(SlowHandler.most, SlowHandler.running)
+        time.sleep(self.delay)
+        with self.lock:
+            SlowHandler.running -= 1
+        if 'error' in self.path:
+            self.reply({'error': 'Not found'})
+        else:
+            id = int(self.path.split('/')[-1].split('.')[0])
+            self.reply({'id': id, 'text': 'status %d' % id})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.getheader('Content-Length')))
+        self.paths.append(body)
+        self.reply({'id': 1, 'text': 'posted'})
+
+    def reply(self, data):
+        body = json.dumps(data)
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('X-RateLimit-Limit', '150')
+        self.send_header('X-RateLimit-Remaining', '149')
+        self.send_header('X-RateLimit-Reset', str(int(time.time()) + 3600))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class TestAsyncApi(unittest.TestCase):
+
+    def setUp(self):
+        SlowHandler.running = SlowHandler.most = 0
+        SlowHandler.paths = []
+        self.server = SlowServer(('127.0.0.1', 0), SlowHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.api = ApiPatch('key', 'secret', 'token', 'token_secret',
+                base_url='http://127.0.0.1:%d/1' % self.server.server_port)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_concurrent(self):
+        client = AsyncApi(self.api, max_requests=20)
+        statuses = client.gather([client.GetStatus(i) for i in range(1, 21)])
+        self.assertEqual([s.text for s in statuses],
+                         ['status %d' % i for i in range(1, 21)])
+        self.assertGreater(SlowHandler.most, 1)
+
+    @helpers.benchmark
+    def test_concurrent_budget(self):
+        client = AsyncApi(self.api, max_requests=20)
+        start = time.time()
+        client.gather([client.GetStatus(i) for i in range(1, 21)])
+        # one after the other they would take four seconds
+        self.assertLess(time.time() - start, 2)
+
+    def test_bounded(self):
+        client = AsyncApi(self.api, max_requests=3)
+        client.gather([client.GetStatus(i) for i in range(1, 10)])
+        self.assertLessEqual(SlowHandler.most, 3)
+
+    def test_signed(self):
+        client = AsyncApi(self.api)
+        client.gather([client.GetStatus(42), client.PostUpdate(u'héllo')])
+        self.assertTrue('oauth_signature=' in SlowHandler.paths[0])
+        self.assertTrue('oauth_token=token' in SlowHandler.paths[0])
+        post = [p for p in SlowHandler.paths if 'status=' in p]
+        self.assertTrue('status=h%C3%A9llo' in post[0])
+
+    def test_error(self):
+        client = AsyncApi(self.api)
+        result = client.GetUser('error')
+        callbacks = []
+        result.add_callback(callbacks.append)
+        client.run()
+        self.assertRaises(TwitterError, result.get)
+        self.assertEqual(callbacks, [result])
+
+    def test_rate_limit(self):
+        rate_limit = RateLimit(reserve=10)
+        client = AsyncApi(self.api, rate_limit=rate_limit)
+        client.gather([client.GetStatus(1)])
+        self.assertTrue(rate_limit.known())
+
+    def test_timeout(self):
+        SlowHandler.delay = 1
+        try:
+            client = AsyncApi(self.api)
+            result = client.GetStatus(1)
+            client.run(timeout=0.2)
+            self.assertTrue(result.done)
+            self.assertRaises(IOError, result.get)
+        finally:
+            SlowHandler.delay = 0.2
+
+    def test_proxy(self):
+        api = ApiPatch('key', 'secret', 'token', 'token_secret',
+                base_url='http://api.twitter.invalid/1')
+        client = AsyncApi(api, proxy='127.0.0.1:%d' % self.server.server_port)
+        status, = client.gather([client.GetStatus(7)])
+        self.assertEqual(status.text, 'status 7')
+        self.assertTrue(SlowHandler.paths[0].startswith(
+            'http://api.twitter.invalid/1/statuses/show/7.json'))
+
+    def test_proxy_tunnel(self):
+        # The server refuses CONNECT, it is asked before anything is sent
+        api = ApiPatch('key', 'secret', 'token', 'token_secret',
+                base_url='https://api.twitter.invalid/1')
+        client = AsyncApi(api, proxy='127.0.0.1:%d' % self.server.server_port)
+        result = client.GetStatus(7)
+        client.run(timeout=5)
+        self.assertRaises(URLError, result.get)
+        self.assertEqual(SlowHandler.paths, [])
+
+    def test_lookup_failed(self):
+        api = ApiPatch('key', 'secret', 'token', 'token_secret',
+                base_url='http://nowhere.invalid/1')
+        client = AsyncApi(api)
+        failed = client.GetStatus(1)
+        # Another host is not held by the failed lookup
+        found = client.request('%s/statuses/show/2.json' % self.api.base_url,
+                lambda data: data['id'])
+        client.run(timeout=5)
+        self.assertRaises(URLError, failed.get)
+        self.assertEqual(found.get(), 2)
+
+if __name__ == '__main__':
+    unittest.main ()
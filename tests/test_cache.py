@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2011 Nicolas Paris <nicolas.caen@gmail.com>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import sys
+import shutil
+import tempfile
+import threading
+import BaseHTTPServer
+import gettext
+gettext.install('tyrs', unicode=1)
+
+sys.path.insert(0, '../src')
+from cache import ResponseCache, cache_key, get_ttl
+from connection import ConnectionPool
+from tweets import ApiPatch
+
+class StatusHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    requests = 0
+
+    def do_GET(self):
+        StatusHandler.requests += 1
+        body = '{"id": 42, "text": "hello", "user": {"screen_name": "nick"}}'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class TestResponseCache(unittest.TestCase):
+
+    def test_key_without_nonce(self):
+        first = cache_key('https://api.twitter.com/1/statuses/show/1.json?'
+                          'oauth_nonce=1&oauth_timestamp=10&oauth_token=me&oauth_signature=a')
+        second = cache_key('https://api.twitter.com/1/statuses/show/1.json?'
+                           'oauth_signature=b&oauth_token=me&oauth_timestamp=11&oauth_nonce=2')
+        other = cache_key('https://api.twitter.com/1/statuses/show/1.json?oauth_token=you')
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+
+    def test_ttl(self):
+        self.assertEqual(get_ttl('https://api.twitter.com/1/statuses/show/1.json'), 3600)
+        self.assertEqual(get_ttl('https://api.twitter.com/1/statuses/home_timeline.json'), 20)
+        self.assertEqual(get_ttl('https://api.twitter.com/1/friendships/create.json'), 0)
+
+    def test_lru(self):
+        cache = ResponseCache(size=2)
+        cache.Set('a', '1')
+        cache.Set('b', '2')
+        cache.get('a', 60)
+        cache.Set('c', '3')
+        self.assertEqual(cache.get('a', 60), '1')
+        self.assertEqual(cache.get('b', 60), None)
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+    def test_expired(self):
+        cache = ResponseCache()
+        cache.Set('a', '1')
+        self.assertEqual(cache.get('a', 0), None)
+
+    def test_disk(self):
+        directory = tempfile.mkdtemp()
+        try:
+            ResponseCache(directory=directory).Set('a', '1')
+            cache = ResponseCache(directory=directory)
+            self.assertEqual(cache.get('a', 60), '1')
+            cache.Remove('a')
+            self.assertEqual(ResponseCache(directory=directory).get('a', 60), None)
+        finally:
+            shutil.rmtree(directory)
+
+class TestApiCache(unittest.TestCase):
+
+    def setUp(self):
+        StatusHandler.requests = 0
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), StatusHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.pool = ConnectionPool()
+        self.api = ApiPatch('key', 'secret', 'token', 'token_secret',
+                base_url='http://127.0.0.1:%d/1' % self.server.server_port,
+                pool=self.pool)
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_signed_requests_cached(self):
+        self.assertEqual(self.api.GetStatus(42).text, 'hello')
+        self.assertEqual(self.api.GetStatus(42).text, 'hello')
+        self.assertEqual(StatusHandler.requests, 1)
+        self.assertEqual(self.api._cache.hits, 1)
+
+    def test_no_cache(self):
+        self.api.SetCache(None)
+        self.api.GetStatus(42)
+        self.api.GetStatus(42)
+        self.assertEqual(StatusHandler.requests, 2)
+
+if __name__ == '__main__':
+    unittest.main ()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2011 Nicolas Paris <nicolas.caen@gmail.com>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import sys
+import threading
+import BaseHTTPServer
+sys.path.append('../src')
+from connection import ConnectionPool
+
+class KeepAliveHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    clients = set()
+
+    def do_GET(self):
+        self.clients.add(self.client_address)
+        body = self.path
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.getheader('Content-Length'))
+        body = self.rfile.read(length)
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        KeepAliveHandler.clients = set()
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%d' % self.server.server_port
+        self.pool = ConnectionPool(size=2, timeout=60)
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connection_reused(self):
+        for i in range(5):
+            response = self.pool.request(self.url + '/statuses?page=%d' % i)
+            self.assertEqual(response.data, '/statuses?page=%d' % i)
+        self.assertEqual(len(KeepAliveHandler.clients), 1)
+
+    def test_post(self):
+        response = self.pool.request(self.url + '/update', 'status=hello')
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.data, 'status=hello')
+
+    def test_idle_timeout(self):
+        self.pool.timeout = 0
+        self.pool.request(self.url + '/')
+        self.pool.request(self.url + '/')
+        self.assertEqual(len(KeepAliveHandler.clients), 2)
+
+if __name__ == '__main__':
+    unittest.main ()
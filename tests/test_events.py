@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2011 Nicolas Paris <nicolas.caen@gmail.com>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import sys
+import threading
+sys.path.insert(0, '../src')
+from events import EventQueue, LatencyHistogram
+
+class TestEventQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.events = EventQueue()
+        self.drawn = []
+
+    def draw(self, what):
+        self.drawn.append((what, threading.current_thread()))
+
+    def test_ui_thread_draws_now(self):
+        self.events.call(self.draw, 'now')
+        self.assertEqual(len(self.drawn), 1)
+
+    def test_other_threads_post(self):
+        thread = threading.Thread(target=self.events.call, args=(self.draw, 'later'))
+        thread.start()
+        thread.join()
+        self.assertEqual(self.drawn, [])
+        self.assertEqual(self.events.drain(), 1)
+        self.assertEqual(self.drawn, [('later', threading.current_thread())])
+
+    def test_same_event_once(self):
+        for what in ('home', 'mentions', 'home'):
+            self.events.post(self.draw, what)
+        self.events.drain()
+        self.assertEqual([what for what, thread in self.drawn], ['home', 'mentions'])
+
+    def test_failing_event(self):
+        self.events.post(lambda: 1 / 0)
+        self.events.post(self.draw, 'after')
+        self.assertEqual(self.events.drain(), 2)
+        self.assertEqual(len(self.drawn), 1)
+
+class TestLatencyHistogram(unittest.TestCase):
+
+    def test_percentiles(self):
+        histogram = LatencyHistogram()
+        self.assertEqual(histogram.percentile(50), None)
+        for i in range(98):
+            histogram.record(0.003)
+        histogram.record(0.15)
+        histogram.record(5)
+        self.assertEqual(histogram.percentile(50), 5)
+        self.assertEqual(histogram.percentile(99), 200)
+        self.assertEqual(histogram.percentile(100), None)
+        self.assertTrue('>2000ms: 1' in histogram.report())
+
+if __name__ == '__main__':
+    unittest.main ()
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2011 Nicolas Paris <nicolas.caen@gmail.com>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import sys
+import timeit
+import gettext
+gettext.install('tyrs', unicode=1)
+
+sys.path.insert(0, '../src')
+import tyrs
+from filter import FilterStatus
+from twitter import Status, User
+
+class FakeConf(object):
+    my_nick = 'Tyrs'
+
+    def __init__(self, **filter):
+        self.filter = {
+            'activate': True,
+            'myself':   False,
+            'behavior': 'all',
+            'except':   [],
+        }
+        self.filter.update(filter)
+
+def status(text, nick='nick', source='web', lang='en'):
+    return Status(id=1, text=text, source=source,
+                  user=User(screen_name=nick, lang=lang))
+
+def rules(count):
+    '''About the same number of each kind of rule'''
+    kinds = ('keyword:word%d', 'nick:nick%d', 'hashtag:tag%d',
+             'keyword:two words%d', 'source:client%d')
+    return [kinds[i % len(kinds)] % i for i in range(count)]
+
+class TestFilter(unittest.TestCase):
+
+    def get_filter(self, **filter):
+        tyrs.container.add('conf', FakeConf(**filter))
+        return FilterStatus()
+
+    def test_without_url(self):
+        statuses = [status('no url'), status('see http://tyrs.nicosphere.net')]
+        result = self.get_filter().filter(statuses)
+        self.assertEqual([s.text for s in result], ['see http://tyrs.nicosphere.net'])
+
+    def test_not_activated(self):
+        statuses = [status('no url')]
+        self.assertEqual(len(self.get_filter(activate=False).filter(statuses)), 1)
+
+    def test_exception(self):
+        statuses = [status('no url', 'friend'), status('no url', 'other')]
+        result = self.get_filter(**{'except': ['friend']}).filter(statuses)
+        self.assertEqual([s.user.screen_name for s in result], ['friend'])
+
+    def test_behavior_none(self):
+        statuses = [status('no url', 'friend'), status('no url', 'other')]
+        result = self.get_filter(behavior='none', **{'except': ['friend']}).filter(statuses)
+        self.assertEqual([s.user.screen_name for s in result], ['other'])
+
+    def test_myself(self):
+        statuses = [status('hello @tyrs'), status('mine', 'Tyrs')]
+        self.assertEqual(len(self.get_filter().filter(statuses)), 2)
+        self.assertEqual(len(self.get_filter(myself=True).filter(statuses)), 1)
+
+    def test_exception_does_not_grow(self):
+        filter = self.get_filter(**{'except': ['friend']})
+        filter.filter([status('no url')] * 10)
+        self.assertEqual(filter.exception, frozenset(['friend']))
+        self.assertEqual(tyrs.container['conf'].filter['except'], ['friend'])
+
+class TestRules(unittest.TestCase):
+
+    def get_filter(self, rules):
+        tyrs.container.add('conf', FakeConf(activate=False, rules=rules))
+        return FilterStatus()
+
+    def texts(self, rules, statuses):
+        return [s.text for s in self.get_filter(rules).filter(statuses)]
+
+    def test_keyword(self):
+        statuses = [status('Spoiler alert'), status('nothing'), status('spoilers')]
+        self.assertEqual(self.texts(['keyword:spoiler'], statuses),
+                         ['nothing', 'spoilers'])
+
+    def test_phrase(self):
+        statuses = [status('the Game of Thrones'), status('game over')]
+        self.assertEqual(self.texts(['keyword:game of thrones'], statuses),
+                         ['game over'])
+
+    def test_hashtag(self):
+        statuses = [status('go #FOOTBALL'), status('football')]
+        self.assertEqual(self.texts(['hashtag:#football'], statuses), ['football'])
+
+    def test_nick_and_source(self):
+        statuses = [status('a', nick='Annoying'), status('b', source='<a href="x">4sq</a>'),
+                    status('c')]
+        self.assertEqual(self.texts(['nick:@annoying', 'source:4sq'], statuses), ['c'])
+
+    def test_regex(self):
+        statuses = [status('a 1234 b'), status('a b')]
+        self.assertEqual(self.texts([r'regex:\d{4}'], statuses), ['a b'])
+
+    def test_url_retweet_lang(self):
+        statuses = [status('http://a.b'), status('RT @x: hi'), status('salut', lang='fr'),
+                    status('hi')]
+        self.assertEqual(self.texts(['has-url', 'is-retweet', 'lang:fr'], statuses),
+                         ['hi'])
+
+    def test_invalid_rule(self):
+        statuses = [status('hi')]
+        self.assertEqual(self.texts(['unknown:x', 'keyword:'], statuses), ['hi'])
+
+class BenchRules(unittest.TestCase):
+    '''The cost per status must not grow with the number of rules'''
+
+    def bench(self, count):
+        tyrs.container.add('conf', FakeConf(activate=False, rules=rules(count)))
+        filter = FilterStatus()
+        statuses = [status('some status %d with #tag%d two words' % (i, i),
+                           nick='nick%d' % (i % 2000),
+                           source='<a href="x">client%d</a>' % i)
+                    for i in range(10000)]
+        return min(timeit.repeat(lambda: filter.filter(statuses), number=1, repeat=3))
+
+    def test_10k_statuses_1k_rules(self):
+        few = self.bench(10)
+        many = self.bench(1000)
+        self.assertLess(many, few * 3)
+
+if __name__ == '__main__':
+    unittest.main ()
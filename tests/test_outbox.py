@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2011 Nicolas Paris <nicolas.caen@gmail.com>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import unittest
+import sys
+import time
+import shutil
+import tempfile
+from urllib2 import URLError
+import gettext
+gettext.install('tyrs', unicode=1)
+
+sys.path.insert(0, '../src')
+import tyrs
+import constant
+import helpers
+from outbox import Outbox
+from tweets import Tweets
+from status import compact
+from twitter import Status, User, TwitterError
+
+class FakeConf(helpers.FakeConf):
+    params = dict(constant.params, cache_size=0)
+    service = 'identica'
+    # nothing listens there, refused at once
+    base_url = 'http://127.0.0.1:1/api'
+    token = {'identica': {'consumer_key': 'key', 'consumer_secret': 'secret'}}
+    oauth_token = 'token'
+    oauth_token_secret = 'token_secret'
+
+    def __init__(self):
+        self.nick = 'stored_nick'
+
+    def load_my_nick(self):
+        return self.nick
+
+    def save_my_nick(self, nick):
+        self.nick = nick
+
+class FakeInterface(helpers.FakeInterface):
+
+    def __init__(self):
+        helpers.FakeInterface.__init__(self)
+        self.users = []
+
+    def display_user(self, user):
+        self.users.append(user)
+
+class FakeApi(object):
+    '''Every request fails while offline'''
+
+    def __init__(self):
+        self.online = False
+        self.sent = []
+
+    def check(self):
+        if not self.online:
+            raise URLError('Network is unreachable')
+
+    def VerifyCredentials(self):
+        self.check()
+        return User(screen_name='tyrs')
+
+    def GetHomeTimeline(self, since_id=None, max_id=None, page=None):
+        self.check()
+        return [Status(id=1, text='hello', user=User(screen_name='nick'))]
+
+    def PostUpdate(self, status, in_reply_to_status_id=None):
+        self.check()
+        if status == 'duplicate':
+            raise TwitterError('Status is a duplicate.')
+        self.sent.append(status)
+
+    def CreateFavorite(self, status):
+        self.check()
+        self.sent.append(status.id)
+
+    def GetUser(self, nick):
+        self.check()
+        return User(screen_name=nick)
+
+class TestOutbox(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = self.directory + '/tyrs.outbox'
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_durable(self):
+        outbox = Outbox(self.path)
+        outbox.add('tweet', None, 'PostUpdate', [u'héllo', None])
+        status = compact(Status(id=42, text='', user=User(screen_name='nick')))
+        outbox.add('favorite', None, 'CreateFavorite', [status])
+        outbox.close()
+
+        outbox = Outbox(self.path)
+        pending = outbox.pending()
+        self.assertEqual(len(outbox), 2)
+        self.assertEqual(pending[0][1:], ('tweet', None, 'PostUpdate', [u'héllo', None]))
+        self.assertEqual(pending[1][4][0].id, 42)
+        outbox.remove(pending[0][0])
+        self.assertEqual(len(outbox), 1)
+        outbox.close()
+
+class TestOffline(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.outbox = Outbox(self.directory + '/tyrs.outbox')
+        helpers.setup_container(FakeConf(), outbox=self.outbox)
+        self.tweets = Tweets()
+        self.tweets.interface = FakeInterface()
+
+    def tearDown(self):
+        tyrs.container['workers'].close()
+        self.outbox.close()
+        shutil.rmtree(self.directory)
+
+    def wait(self, condition):
+        for i in range(200):
+            if condition():
+                return True
+            time.sleep(0.01)
+        return False
+
+    def test_start_offline(self):
+        start = time.time()
+        self.tweets.authentication()
+        self.assertLess(time.time() - start, 5)
+        self.assertTrue(self.tweets.offline)
+        self.assertEqual(self.tweets.myself.screen_name, 'stored_nick')
+
+    def test_queued_then_sent(self):
+        self.tweets.api = api = FakeApi()
+        self.tweets.post_tweet('hello')
+        self.assertTrue(self.wait(lambda: len(self.outbox) == 1))
+        self.assertTrue(self.tweets.offline)
+        # no request while offline, queued right away
+        self.tweets.background('favorite', None, api.CreateFavorite, Status(id=7))
+        self.tweets.post_tweet('duplicate')
+        self.assertEqual(len(self.outbox), 3)
+
+        self.tweets.update_timeline('home')
+        self.assertEqual(len(self.outbox), 3)
+
+        api.online = True
+        self.tweets.update_timeline('home')
+        self.assertTrue(self.wait(lambda: not len(self.outbox)))
+        self.assertEqual(api.sent, ['hello', 7])
+        self.assertFalse(self.tweets.offline)
+        self.assertEqual(tyrs.container['conf'].nick, 'tyrs')
+
+    def test_reads_not_queued(self):
+        self.tweets.api = FakeApi()
+        self.tweets.background('search', 'tyrs', self.tweets.api.GetUser, 'tyrs')
+        time.sleep(0.1)
+        self.assertEqual(len(self.outbox), 0)
+
+    def test_user_offline(self):
+        self.tweets.api = api = FakeApi()
+        self.tweets.get_user('nick')
+        self.assertTrue(self.wait(lambda: self.tweets.flash_message.event == 'user'))
+        self.assertEqual(self.tweets.flash_message.level, 1)
+        api.online = True
+        self.tweets.get_user('nick')
+        users = self.tweets.interface.users
+        events = tyrs.container['events']
+        self.assertTrue(self.wait(lambda: events.drain() and users))
+        self.assertEqual(users[0].screen_name, 'nick')
+
+if __name__ == '__main__':
+    unittest.main ()
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2011 Nicolas Paris <nicolas.caen@gmail.com>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import sys
+import time
+sys.path.insert(0, '../src')
+from ratelimit import RateLimit
+
+def headers(remaining, reset_in=600):
+    return {
+        'x-ratelimit-limit': '350',
+        'x-ratelimit-remaining': str(remaining),
+        'x-ratelimit-reset': str(int(time.time() + reset_in)),
+    }
+
+class TestRateLimit(unittest.TestCase):
+
+    def setUp(self):
+        self.rate_limit = RateLimit(reserve=10)
+
+    def test_unknown(self):
+        self.rate_limit.update({'content-type': 'application/json'})
+        self.assertTrue(self.rate_limit.allow())
+        self.assertEqual(self.rate_limit.hourly_budget(), None)
+
+    def test_reserve_for_user(self):
+        self.rate_limit.update(headers(10))
+        self.assertFalse(self.rate_limit.allow())
+        self.assertTrue(self.rate_limit.allow(interactive=True))
+        self.rate_limit.update(headers(0))
+        self.assertFalse(self.rate_limit.allow(interactive=True))
+
+    def test_next_window(self):
+        self.rate_limit.update(headers(0, reset_in=-1))
+        self.assertTrue(self.rate_limit.allow())
+        self.assertEqual(self.rate_limit.wait(), 0)
+
+    def test_hourly_budget(self):
+        self.rate_limit.update(headers(110, reset_in=1800))
+        self.assertAlmostEqual(self.rate_limit.hourly_budget(), 200, delta=1)
+
+if __name__ == '__main__':
+    unittest.main ()
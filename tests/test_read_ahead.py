@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2011 Nicolas Paris <nicolas.caen@gmail.com>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import sys
+import threading
+import gettext
+gettext.install('tyrs', unicode=1)
+
+sys.path.insert(0, '../src')
+import tyrs
+import helpers
+from tweets import Tweets
+from twitter import Status, User
+
+class FakeApi(object):
+    '''A home timeline of 50 statuses, 20 a page, sent once released'''
+
+    def __init__(self):
+        self.requests = 0
+        self.released = threading.Event()
+        self.released.set()
+
+    def GetHomeTimeline(self, since_id=None, max_id=None, page=None):
+        self.requests += 1
+        self.released.wait(5)
+        top = max_id or 50
+        return [Status(id=i, text='status %d' % i, user=User(screen_name='nick'))
+                for i in range(top, max(top - 20, 0), -1)]
+
+class TestReadAhead(unittest.TestCase):
+
+    def setUp(self):
+        helpers.setup_container()
+        self.tweets = Tweets()
+        self.tweets.api = FakeApi()
+        self.tweets.interface = helpers.FakeInterface()
+        self.timeline = tyrs.container['timelines']['home']
+        self.timeline.append_new_statuses(self.tweets.api.GetHomeTimeline())
+
+    def tearDown(self):
+        tyrs.container['workers'].close()
+
+    def wait(self):
+        self.assertTrue(helpers.wait_for(lambda: not self.tweets.reading_ahead))
+
+    def test_does_not_block(self):
+        self.tweets.api.released.clear()
+        self.tweets.read_ahead('home')
+        # back before the page came
+        self.assertEqual(self.timeline.count, 20)
+        self.tweets.api.released.set()
+        self.wait()
+        self.assertEqual(self.timeline.count, 40)
+        self.assertEqual(self.timeline.page, 2)
+
+    def test_once_at_a_time(self):
+        self.tweets.api.released.clear()
+        self.tweets.read_ahead('home')
+        self.tweets.read_ahead('home')
+        self.tweets.api.released.set()
+        self.wait()
+        self.assertEqual(self.tweets.api.requests, 2)
+
+    def test_end_of_timeline(self):
+        for i in range(4):
+            self.tweets.read_ahead('home')
+            self.wait()
+        self.assertEqual(self.timeline.count, 50)
+        # the last page was empty, it is not asked for again
+        self.assertEqual(self.tweets.api.requests, 4)
+
+if __name__ == '__main__':
+    unittest.main ()
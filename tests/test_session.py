@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2011 Nicolas Paris <nicolas.caen@gmail.com>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import unittest
+import sys
+import os
+import json
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, '../src')
+from session import Session
+
+class CountingSession(Session):
+
+    def __init__(self, *args, **kwargs):
+        self.writes = 0
+        Session.__init__(self, *args, **kwargs)
+
+    def write(self, data):
+        self.writes += 1
+        Session.write(self, data)
+
+class TestSession(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'tyrs.session')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_debounced(self):
+        session = CountingSession(self.path, delay=0.1)
+        for i in range(1000):
+            session.set('last_read', str(i))
+        self.assertFalse(os.path.exists(self.path))
+        time.sleep(0.3)
+        self.assertEqual(session.writes, 1)
+        self.assertEqual(json.load(open(self.path)), {'last_read': '999'})
+
+    def test_unchanged_not_written(self):
+        session = CountingSession(self.path, delay=0.05)
+        session.set('cursor_home', 42)
+        session.flush()
+        session.set('cursor_home', 42)
+        time.sleep(0.1)
+        self.assertEqual(session.writes, 1)
+
+    def test_flush(self):
+        session = Session(self.path, delay=60)
+        session.set('last_read', '12')
+        session.set('cursor_home', 10)
+        session.flush()
+        self.assertEqual(Session(self.path).get('last_read'), '12')
+        self.assertEqual(Session(self.path).get('cursor_home'), 10)
+        # only the session, no temporary file left
+        self.assertEqual(os.listdir(self.directory), ['tyrs.session'])
+
+    def test_failed_write(self):
+        os.mkdir(self.path)
+        session = Session(self.path, delay=60)
+        session.set('last_read', '1')
+        session.flush()
+        self.assertEqual(os.listdir(self.directory), ['tyrs.session'])
+
+    def test_corrupted(self):
+        with open(self.path, 'w') as session:
+            session.write('{"last_read": ')
+        self.assertEqual(Session(self.path).get('last_read'), None)
+
+if __name__ == '__main__':
+    unittest.main ()
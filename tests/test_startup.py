@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2011 Nicolas Paris <nicolas.caen@gmail.com>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import unittest
+import sys
+import json
+import time
+import threading
+import subprocess
+import gettext
+gettext.install('tyrs', unicode=1)
+
+sys.path.insert(0, '../src')
+import tyrs
+import helpers
+from tweets import Tweets
+from twitter import Status, User
+
+# Seconds to import tyrs and every module it loads before the interface is
+# created, only an import time budget: the screen and the store are not
+# part of it
+IMPORT_TIME_BUDGET = 0.5
+
+# Run in a fresh interpreter, like python -X importtime: the time spent in
+# each import, with and without the modules it imports
+IMPORT_TIME = '''
+import sys
+import json
+import time
+import __builtin__
+sys.path.insert(0, '../src')
+
+_import = __builtin__.__import__
+modules = {}
+children = [0.]
+
+def timed_import(name, *args, **kwargs):
+    start = time.time()
+    children.append(0.)
+    try:
+        return _import(name, *args, **kwargs)
+    finally:
+        cumulative = time.time() - start
+        inner = children.pop()
+        children[-1] += cumulative
+        self, total = modules.get(name, (0., 0.))
+        modules[name] = (self + cumulative - inner, total + cumulative)
+
+__builtin__.__import__ = timed_import
+start = time.time()
+import gettext
+gettext.install('tyrs', unicode=1)
+import %s
+total = time.time() - start
+__builtin__.__import__ = _import
+print json.dumps({'total': total, 'modules': modules, 'loaded': sys.modules.keys()})
+'''
+
+def import_time(module):
+    output = subprocess.check_output([sys.executable, '-c', IMPORT_TIME % module])
+    return json.loads(output)
+
+def report(result, count=10):
+    modules = sorted(result['modules'].items(), key=lambda m: -m[1][0])
+    lines = ['{0:>8} {1:>10} | {2}'.format('self us', 'cumul us', 'module')]
+    for name, (self, total) in modules[:count]:
+        lines.append('{0:8.0f} {1:10.0f} | {2}'.format(self * 1e6, total * 1e6, name))
+    return '\n'.join(lines)
+
+class TestStartup(unittest.TestCase):
+
+    @helpers.benchmark
+    def test_import_time_budget(self):
+        result = min([import_time('tyrs') for i in range(3)], key=lambda r: r['total'])
+        # the slowest imports are shown when over budget
+        self.assertLess(result['total'], IMPORT_TIME_BUDGET, report(result))
+
+    def test_optional_modules_deferred(self):
+        loaded = import_time('tyrs')['loaded']
+        for module in ('shorter', 'stream', 'asyncapi', 'tweets', 'twitter', 'oauth2'):
+            self.assertFalse(module in loaded, module)
+
+    def test_shortener_from_the_launcher(self):
+        # ./tyrs imports src.tyrs, not tyrs
+        script = ('import gettext; gettext.install("tyrs", unicode=1); '
+                  'import src.editor; '
+                  'print src.editor.get_shorter("ur1ca").__class__.__module__')
+        output = subprocess.check_output([sys.executable, '-c', script], cwd='..')
+        self.assertEqual(output.strip(), 'src.shorter.ur1ca')
+
+    def test_configured_shortener_only(self):
+        loaded = import_time('editor; editor.get_shorter("msudpl")')['loaded']
+        self.assertTrue('shorter.msudpl' in loaded)
+        for module in ('shorter.googl', 'shorter.bitly', 'shorter.ur1ca'):
+            self.assertFalse(module in loaded, module)
+
+class FakeConf(helpers.FakeConf):
+    my_nick = ''
+
+    def load_my_nick(self):
+        return 'old_nick'
+
+    def save_my_nick(self, nick):
+        pass
+
+class FakeApi(object):
+    '''Answers once released'''
+
+    def __init__(self):
+        self.requests = []
+        self.released = threading.Event()
+        self.released.set()
+
+    def VerifyCredentials(self):
+        self.released.wait(5)
+        return User(screen_name='tyrs')
+
+    def GetHomeTimeline(self, since_id=None, max_id=None, page=None):
+        self.requests.append('home')
+        self.released.wait(5)
+        return [Status(id=i, text='status %d' % i, user=User(screen_name='nick'))
+                for i in range(3, 0, -1)]
+
+    def GetMentions(self, since_id=None, max_id=None, page=None):
+        self.requests.append('mentions')
+        return []
+
+class TestFirstUpdate(unittest.TestCase):
+
+    def setUp(self):
+        helpers.setup_container(FakeConf(), timelines=('home', 'mentions'),
+                                workers=4)
+        self.tweets = Tweets()
+        self.tweets.api = FakeApi()
+        self.tweets.myself = User(screen_name='old_nick')
+        self.tweets.interface = helpers.FakeInterface()
+
+    def tearDown(self):
+        tyrs.container['workers'].close()
+
+    def wait(self, condition):
+        for i in range(200):
+            if condition():
+                return True
+            time.sleep(0.01)
+        return False
+
+    def test_does_not_block(self):
+        self.tweets.api.released.clear()
+        self.tweets.first_update(['home', 'mentions'])
+        timeline = tyrs.container['timelines']['home']
+        # nothing came yet, first_update did not wait for it
+        self.assertEqual(timeline.count, 0)
+        self.assertEqual(self.tweets.myself.screen_name, 'old_nick')
+        self.tweets.api.released.set()
+        self.assertTrue(self.wait(lambda: timeline.count == 3))
+        self.assertTrue(self.wait(lambda: self.tweets.myself.screen_name == 'tyrs'))
+        # the first statuses are not unread
+        self.assertEqual(timeline.unread, 0)
+        self.assertEqual(timeline.last_read, 3)
+
+    def test_once_at_a_time(self):
+        self.tweets.api.released.clear()
+        self.tweets.update_in_background('home')
+        self.tweets.update_in_background('home')
+        self.tweets.api.released.set()
+        self.assertTrue(self.wait(lambda: not self.tweets.updating))
+        self.assertEqual(self.tweets.api.requests, ['home'])
+
+    def test_empty_not_displayed(self):
+        self.tweets.update_in_background('mentions')
+        self.assertTrue(self.wait(lambda: not self.tweets.updating))
+        tyrs.container['events'].drain()
+        self.assertEqual(self.tweets.interface.displayed, 0)
+
+if __name__ == '__main__':
+    unittest.main ()
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2011 Nicolas Paris <nicolas.caen@gmail.com>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import unittest
+import sys
+import time
+import shutil
+import tempfile
+import gettext
+gettext.install('tyrs', unicode=1)
+
+sys.path.insert(0, '../src')
+import tyrs
+import helpers
+from store import StatusStore, dump, load
+from tweets import Tweets
+from status import compact
+from twitter import Status, User, DirectMessage
+
+class FakeApi(object):
+    '''Twenty statuses a page, newer than since_id'''
+
+    def __init__(self, newest):
+        self.newest = newest
+        self.since_ids = []
+        self.max_ids = []
+
+    def GetHomeTimeline(self, since_id=None, max_id=None, page=None):
+        self.since_ids.append(since_id)
+        self.max_ids.append(max_id)
+        return statuses(since_id + 1, max_id or self.newest)[:20]
+
+def statuses(first, last):
+    user = User(screen_name='nick', name='Nick', profile_image_url='http://a.b/c.png')
+    return [Status(id=i, text=u'status %d é' % i, user=user, source='web',
+                   created_at='Sun Nov 06 10:00:00 +0000 2011')
+            for i in range(last, first - 1, -1)]
+
+class TestStatusStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = self.directory + '/tyrs.db'
+        self.store = StatusStore(self.path, size=100)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def test_dump_load(self):
+        retweet = Status(id=2, text='RT', user=User(screen_name='rt'),
+                         retweeted_status=statuses(1, 1)[0])
+        status = load(dump(compact(retweet)))
+        self.assertEqual(status.retweeted_status.user.name, 'Nick')
+        self.assertEqual(status.rt, None)
+        message = DirectMessage(id=3, text='hi', sender_screen_name='nick',
+                                recipient_screen_name='tyrs')
+        self.assertEqual(load(dump(compact(message))).sender_screen_name, 'nick')
+
+    def test_save_load(self):
+        self.store.save('home', statuses(1, 10))
+        self.store.save('home', statuses(5, 15))
+        self.store.save('mentions', statuses(1, 3))
+        self.store.close()
+        self.store = StatusStore(self.path, size=100)
+        loaded = self.store.load('home')
+        self.assertEqual([s.id for s in loaded], range(15, 0, -1))
+        self.assertEqual(loaded[0].text, u'status 15 é')
+        self.assertEqual(loaded[0].created_at_in_seconds,
+                         compact(statuses(1, 1)[0]).created_at_in_seconds)
+
+    def test_size(self):
+        self.store.save('home', statuses(1, 150))
+        self.store.save('mentions', statuses(1, 10))
+        self.assertEqual([s.id for s in self.store.load('home')], range(150, 50, -1))
+        self.assertEqual(len(self.store.load('mentions')), 10)
+
+    def test_indexes(self):
+        rows = self.store._db.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index'").fetchall()
+        names = [row[0] for row in rows]
+        for name in ('statuses_id', 'statuses_author', 'statuses_created_at'):
+            self.assertTrue(name in names)
+
+class TestWarmStart(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = StatusStore(self.directory + '/tyrs.db', size=1000)
+        helpers.setup_container(store=self.store)
+
+    def tearDown(self):
+        tyrs.container['workers'].close()
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    @helpers.benchmark
+    def test_load_budget(self):
+        self.store.save('home', statuses(1, 1000))
+        start = time.time()
+        timeline = tyrs.container['timelines']['home']
+        timeline.append_new_statuses(self.store.load('home'))
+        self.assertLess(time.time() - start, 0.5)
+
+    def test_only_the_delta(self):
+        self.store.save('home', statuses(1, 1000))
+        timeline = tyrs.container['timelines']['home']
+        timeline.append_new_statuses(self.store.load('home'))
+        self.assertEqual(timeline.count, 1000)
+
+        tweets = Tweets()
+        tweets.api = FakeApi(newest=1005)
+        tweets.interface = helpers.FakeInterface()
+        self.assertEqual(tweets.update_timeline('home'), 5)
+        self.assertEqual(tweets.api.since_ids, [1000])
+        self.assertEqual(self.store.load('home')[0].id, 1005)
+
+    def test_no_gap(self):
+        timeline = tyrs.container['timelines']['home']
+        timeline.append_new_statuses(statuses(1, 1000))
+        tweets = Tweets()
+        tweets.api = FakeApi(newest=1050)
+        tweets.interface = helpers.FakeInterface()
+        self.assertEqual(tweets.update_timeline('home'), 50)
+        self.assertEqual(tweets.api.max_ids, [None, 1030, 1010])
+        self.assertEqual([s.id for s in timeline.statuses[:52]],
+                         range(1050, 998, -1))
+
+    def test_gap_too_long(self):
+        self.store.save('home', statuses(1, 1000))
+        timeline = tyrs.container['timelines']['home']
+        timeline.append_new_statuses(self.store.load('home'))
+        tweets = Tweets()
+        tweets.api = FakeApi(newest=2000)
+        tweets.interface = helpers.FakeInterface()
+        self.assertEqual(tweets.update_timeline('home'), 100)
+        self.assertEqual(len(tweets.api.max_ids), 5)
+        # No hole, what is older comes with lazy loading
+        self.assertEqual([s.id for s in timeline.statuses], range(2000, 1900, -1))
+        self.assertEqual(len(self.store.load('home')), 100)
+
+if __name__ == '__main__':
+    unittest.main ()
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2011 Nicolas Paris <nicolas.caen@gmail.com>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import unittest
+import sys
+import json
+import time
+import threading
+import BaseHTTPServer
+import gettext
+gettext.install('tyrs', unicode=1)
+
+sys.path.insert(0, '../src')
+import tyrs
+import helpers
+from tweets import Tweets, ApiPatch
+from connection import ConnectionPool
+from stream import StreamThread, StreamParser, Backoff
+
+CREATED_AT = 'Sun Nov 06 10:00:00 +0000 2011'
+
+def tweet(id, text):
+    return {'id': id, 'text': text, 'created_at': CREATED_AT,
+            'user': {'screen_name': 'nick'}}
+
+def direct(id, text):
+    return {'direct_message': {'id': id, 'text': text, 'created_at': CREATED_AT,
+            'sender_screen_name': 'nick', 'recipient_screen_name': 'tyrs'}}
+
+class StreamHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    '''
+    Sends the chunks, then keeps the stream open until released or closes
+    it right away
+    '''
+    protocol_version = 'HTTP/1.1'
+    status = 200
+    chunks = []
+    hold = True
+    # Closed without the last chunk
+    truncated = False
+    released = threading.Event()
+    streams = 0
+    polls = 0
+
+    def do_GET(self):
+        if 'user.json' not in self.path:
+            StreamHandler.polls += 1
+            return self.reply('[]')
+        StreamHandler.streams += 1
+        if self.status != 200:
+            return self.send_error(self.status)
+        self.send_response(200)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for chunk in self.chunks:
+            self.wfile.write('%x\r\n%s\r\n' % (len(chunk), chunk))
+            self.wfile.flush()
+        if self.truncated:
+            self.close_connection = 1
+            return
+        if self.hold:
+            self.released.wait(5)
+        self.wfile.write('0\r\n\r\n')
+        self.close_connection = 1
+
+    def reply(self, body):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class ThreadedServer(BaseHTTPServer.HTTPServer):
+    def process_request(self, request, client_address):
+        thread = threading.Thread(target=BaseHTTPServer.HTTPServer.process_request,
+                                  args=(self, request, client_address))
+        thread.daemon = True
+        thread.start()
+
+class TestStreamParser(unittest.TestCase):
+
+    def test_split_messages(self):
+        parser = StreamParser()
+        data = json.dumps(tweet(1, 'one')) + '\r\n\r\n' + json.dumps(tweet(2, 'two')) + '\r\n'
+        messages = []
+        for i in range(0, len(data), 7):
+            messages.extend(parser.feed(data[i:i + 7]))
+        self.assertEqual([m['id'] for m in messages], [1, 2])
+
+    def test_invalid_line(self):
+        messages = StreamParser().feed('{"id": \r\n{"id": 3}\r\n')
+        self.assertEqual(messages, [{'id': 3}])
+
+class TestBackoff(unittest.TestCase):
+
+    def test_network_errors(self):
+        backoff = Backoff()
+        delays = [backoff.network_error() for i in range(100)]
+        self.assertEqual(delays[:2], [0.25, 0.5])
+        self.assertEqual(delays[-1], 16)
+
+    def test_http_errors(self):
+        backoff = Backoff()
+        self.assertEqual([backoff.http_error(503) for i in range(8)],
+                         [5, 10, 20, 40, 80, 160, 320, 320])
+        backoff.reset()
+        self.assertEqual(backoff.http_error(420), 60)
+
+class TestStreamThread(unittest.TestCase):
+
+    def setUp(self):
+        StreamHandler.status = 200
+        StreamHandler.hold = True
+        StreamHandler.truncated = False
+        StreamHandler.released.clear()
+        StreamHandler.streams = StreamHandler.polls = 0
+        self.server = ThreadedServer(('127.0.0.1', 0), StreamHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        url = 'http://127.0.0.1:%d' % self.server.server_port
+
+        helpers.setup_container(timelines=StreamThread.buffers)
+        tyrs.container.add('pool', ConnectionPool())
+        tweets = Tweets()
+        tweets.api = ApiPatch('key', 'secret', 'token', 'token_secret',
+                              base_url=url + '/1', cache=None)
+        tweets.interface = helpers.FakeInterface()
+        tyrs.container.add('api', tweets)
+        self.timelines = tyrs.container['timelines']
+        self.stream = StreamThread(url + '/2/user.json')
+
+    def tearDown(self):
+        self.stream.stop()
+        StreamHandler.released.set()
+        if self.stream.is_alive():
+            self.stream.join(5)
+        tyrs.container['workers'].close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def wait(self, condition):
+        for i in range(200):
+            if condition():
+                return True
+            time.sleep(0.01)
+        return False
+
+    def test_statuses_merged(self):
+        messages = [{'friends': [1, 2]}, tweet(1, 'hello @tyrsbot'),
+                    tweet(2, 'hi @Tyrs!'), direct(3, 'secret')]
+        data = ''.join(json.dumps(message) + '\r\n' for message in messages)
+        # a message over two chunks and a keep-alive
+        StreamHandler.chunks = [data[:50], data[50:], '\r\n']
+        self.stream.start()
+        self.assertTrue(self.wait(lambda: self.timelines['direct'].count == 1))
+        self.assertEqual([s.id for s in self.timelines['home'].statuses], [2, 1])
+        self.assertEqual([s.id for s in self.timelines['mentions'].statuses], [2])
+        self.assertTrue(self.stream.covers('home'))
+        self.assertFalse(self.stream.covers('search'))
+
+    def test_reconnect(self):
+        StreamHandler.chunks = [json.dumps(tweet(1, 'hello')) + '\r\n']
+        StreamHandler.hold = False
+        self.stream.start()
+        self.assertTrue(self.wait(lambda: self.stream.connections >= 2))
+        # what was missed in between is polled
+        self.assertTrue(self.wait(lambda: StreamHandler.polls >= 3))
+        self.assertEqual(self.timelines['home'].count, 1)
+
+    def test_dropped_mid_stream(self):
+        StreamHandler.chunks = [json.dumps(tweet(1, 'hello')) + '\r\n']
+        StreamHandler.truncated = True
+        self.stream.start()
+        self.assertTrue(self.wait(lambda: self.stream.connections >= 2))
+        self.assertTrue(self.stream.is_alive())
+
+    def test_no_nick_no_mention(self):
+        tyrs.container['conf'].my_nick = ''
+        try:
+            self.assertEqual([buff for buff, status in
+                              self.stream.statuses(tweet(1, 'hi @nick'))], ['home'])
+        finally:
+            del tyrs.container['conf'].my_nick
+
+    def test_http_error(self):
+        StreamHandler.status = 420
+        self.stream.start()
+        self.assertTrue(self.wait(lambda: self.stream.backoff.delay == 60))
+        self.assertEqual(StreamHandler.streams, 1)
+        self.assertFalse(self.stream.connected)
+
+if __name__ == '__main__':
+    unittest.main ()
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2011 Nicolas Paris <nicolas.caen@gmail.com>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import sys
+import time
+import gettext
+gettext.install('tyrs', unicode=1)
+
+sys.path.insert(0, '../src')
+import tyrs
+import threading
+import helpers
+from tweets import Tweets
+from asyncapi import AsyncResult
+from status import compact
+from twitter import Status, User, TwitterError
+
+class FakeConf(helpers.FakeConf):
+    params = {'thread_prefetch': 10, 'beep': False}
+
+class FakeInterface(helpers.FakeInterface):
+    '''Tells which thread switched the buffers'''
+
+    def __init__(self, status):
+        helpers.FakeInterface.__init__(self)
+        self.status = status
+        self.buffers = []
+        self.flashed = 0
+
+    def current_status(self):
+        return self.status
+
+    def change_buffer(self, buffer):
+        self.buffers.append((buffer, threading.current_thread()))
+
+    def display_flash_message(self):
+        self.flashed += 1
+
+class FakeApi(object):
+    '''Statuses replying each to the previous id, down to 1'''
+
+    def __init__(self):
+        self.requests = []
+
+    def GetStatus(self, id):
+        self.requests.append(id)
+        if id > 2000:
+            raise TwitterError('No status found with that ID.')
+        return reply(id)
+
+class FakeAsyncApi(object):
+    '''Answers at once, what the FakeApi does, runs once the gate is open'''
+    gate = threading.Event()
+    runs = []
+
+    def __init__(self, api):
+        self.api = api
+
+    def GetStatus(self, id):
+        result = AsyncResult(None)
+        try:
+            result.finish(self.api.GetStatus(id))
+        except TwitterError, e:
+            result.finish(error=e)
+        return result
+
+    def run(self, timeout=None):
+        self.runs.append(threading.current_thread())
+        self.gate.wait(1)
+
+def reply(id):
+    return Status(id=id, text='reply %d' % id, user=User(screen_name='nick'),
+                  in_reply_to_status_id=id - 1 or None)
+
+class TestThread(unittest.TestCase):
+
+    def setUp(self):
+        helpers.setup_container(FakeConf(), timelines=('thread',))
+        self.tweets = Tweets()
+        self.tweets.api = FakeApi()
+        self.tweets.get_async_api = lambda: FakeAsyncApi(self.tweets.api)
+        FakeAsyncApi.gate.set()
+        FakeAsyncApi.runs = []
+        self.tweets.interface = FakeInterface(reply(5))
+        self.thread = tyrs.container['timelines']['thread']
+
+    def tearDown(self):
+        tyrs.container['workers'].close()
+
+    def test_build_thread(self):
+        thread = self.tweets.build_thread(reply(5))
+        self.assertEqual([s.id for s in thread], [4, 3, 2, 1])
+
+    def test_held_statuses_not_requested(self):
+        tyrs.container['status_cache'].add_all([compact(reply(i)) for i in (3, 4)])
+        self.tweets.build_thread(reply(5))
+        self.assertEqual(self.tweets.api.requests, [2, 1])
+
+    def test_long_thread(self):
+        thread = self.tweets.build_thread(reply(1500))
+        self.assertEqual(len(thread), 1499)
+
+    def test_missing_status(self):
+        self.assertEqual(self.tweets.build_thread(reply(2005)), [])
+
+    def wait_prefetch(self):
+        for i in range(50):
+            if not self.tweets.prefetching:
+                break
+            time.sleep(0.01)
+
+    def test_prefetch(self):
+        self.tweets.prefetch_threads([reply(20)])
+        self.wait_prefetch()
+        self.assertEqual(self.tweets.api.requests, range(19, 9, -1))
+        self.assertEqual(len(self.tweets.build_thread(reply(20))), 19)
+
+    def test_prefetch_several(self):
+        tyrs.container['status_cache'].add(compact(reply(118)))
+        self.tweets.prefetch_threads([reply(20), reply(120), reply(30)])
+        self.wait_prefetch()
+        requests = self.tweets.api.requests
+        self.assertEqual(sorted(requests), range(10, 20) + range(20, 30)
+                         + [110, 111, 112, 113, 114, 115, 116, 117, 119])
+
+    def wait(self):
+        '''Until the background work is over, its events handled'''
+        for i in range(100):
+            if not self.tweets.updating:
+                break
+            time.sleep(0.01)
+        tyrs.container['events'].drain()
+
+    def test_open_thread(self):
+        self.tweets.get_thread()
+        self.wait()
+        self.assertEqual([s.id for s in self.thread.statuses], [5, 4, 3, 2, 1])
+        self.assertEqual(self.tweets.interface.buffers,
+                         [('thread', threading.current_thread())])
+
+    def test_update_thread(self):
+        self.tweets.get_thread()
+        self.wait()
+        self.tweets.update_in_background('thread')
+        self.wait()
+        self.assertEqual(self.thread.count, 5)
+        # Updated where it is, not opened again
+        self.assertEqual(len(self.tweets.interface.buffers), 1)
+
+    def test_rate_limited(self):
+        tyrs.container['rate_limit'].update({'x-ratelimit-limit': '350',
+            'x-ratelimit-remaining': '0',
+            'x-ratelimit-reset': str(int(time.time()) + 600)})
+        self.tweets.get_thread()
+        self.wait()
+        self.assertEqual([s.id for s in self.thread.statuses], [5])
+        self.assertEqual(self.tweets.flash_message.event, 'rate_limit')
+        self.assertEqual(self.tweets.interface.flashed, 1)
+
+    def test_prefetch_one_job(self):
+        FakeAsyncApi.gate.clear()
+        self.tweets.prefetch_threads([reply(20)])
+        for i in range(50):
+            if FakeAsyncApi.runs:
+                break
+            time.sleep(0.01)
+        # the other worker is left to the user
+        self.tweets.prefetch_threads([reply(40)])
+        self.assertEqual(len(FakeAsyncApi.runs), 1)
+        FakeAsyncApi.gate.set()
+        self.wait_prefetch()
+        self.assertEqual(len(FakeAsyncApi.runs), 2)
+        self.assertEqual(FakeAsyncApi.runs[0], FakeAsyncApi.runs[1])
+        self.assertEqual(len(self.tweets.api.requests), 20)
+
+if __name__ == '__main__':
+    unittest.main ()
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2011 Nicolas Paris <nicolas.caen@gmail.com>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import sys
+import timeit
+import threading
+import gettext
+gettext.install('tyrs', unicode=1)
+
+sys.path.insert(0, '../src')
+import tyrs
+import utils
+import helpers
+from timeline import Timeline
+from twitter import Status, User
+
+def statuses(first, last):
+    '''Statuses with ids from last down to first, newest first'''
+    user = User(screen_name='nick')
+    return [Status(id=i, text='status %d' % i, user=user,
+                   created_at='Sun Nov 06 10:00:00 +0000 2011')
+            for i in range(last, first - 1, -1)]
+
+class TestTimeline(unittest.TestCase):
+
+    def setUp(self):
+        helpers.setup_statuses()
+
+    def test_append_new_statuses(self):
+        timeline = Timeline()
+        timeline.append_new_statuses(statuses(1, 10))
+        timeline.current = 2
+        timeline.append_new_statuses(statuses(8, 15))
+        self.assertEqual([s.id for s in timeline.statuses], range(15, 0, -1))
+        self.assertEqual(timeline.statuses[timeline.current].id, 8)
+        self.assertEqual(timeline.newest_id, 15)
+
+    def test_append_old_statuses(self):
+        timeline = Timeline()
+        timeline.append_new_statuses(statuses(10, 20))
+        timeline.append_old_statuses(statuses(5, 12))
+        self.assertEqual([s.id for s in timeline.statuses], range(20, 4, -1))
+        self.assertEqual(timeline.position(5), 15)
+        self.assertEqual(timeline.older_than(), 4)
+
+    def test_count_unread(self):
+        timeline = Timeline()
+        timeline.append_new_statuses(statuses(1, 10))
+        timeline.all_read()
+        timeline.append_new_statuses(statuses(11, 14))
+        self.assertEqual(timeline.unread, 4)
+
+    def test_clear(self):
+        timeline = Timeline()
+        timeline.append_new_statuses(statuses(1, 10))
+        timeline.append_new_statuses(statuses(11, 14))
+        timeline.clear()
+        self.assertEqual(timeline.count, 1)
+        self.assertEqual(timeline.position(14), 0)
+        self.assertEqual(timeline.position(13), None)
+
+    def test_evict(self):
+        timeline = Timeline()
+        timeline.retention = {'max_statuses': 10, 'max_age': 0}
+        timeline.append_new_statuses(statuses(1, 10))
+        timeline.append_new_statuses(statuses(11, 15))
+        self.assertEqual(timeline.count, 10)
+        self.assertEqual(timeline.oldest_id, 6)
+        self.assertEqual(timeline.position(5), None)
+
+    def test_evict_keeps_current(self):
+        timeline = Timeline()
+        timeline.retention = {'max_statuses': 10, 'max_age': 0}
+        timeline.append_new_statuses(statuses(1, 10))
+        timeline.current = 9
+        timeline.append_new_statuses(statuses(11, 15))
+        self.assertEqual(timeline.statuses[timeline.current].id, 1)
+        self.assertEqual(timeline.count, 15)
+
+    def test_compact_memory(self):
+        full = statuses(1, 100)
+        timeline = Timeline()
+        timeline.append_new_statuses(list(full))
+        self.assertLess(utils.sizeof(timeline.statuses), utils.sizeof(full))
+        report = timeline.memory_report()
+        self.assertTrue(report.startswith('100 statuses, '), report)
+
+class TestConcurrency(unittest.TestCase):
+
+    def setUp(self):
+        helpers.setup_statuses()
+
+    def test_snapshot_not_modified(self):
+        timeline = Timeline()
+        timeline.append_new_statuses(statuses(10, 20))
+        snapshot = timeline.snapshot()
+        timeline.append_old_statuses(statuses(1, 9))
+        timeline.append_new_statuses(statuses(21, 25))
+        self.assertEqual([s.id for s in snapshot.statuses], range(20, 9, -1))
+
+    def test_merge_while_reading(self):
+        timeline = Timeline()
+        timeline.append_new_statuses(statuses(1, 100))
+        timeline.current = 50
+        selected = timeline.current_status().id
+
+        def merge():
+            for i in range(101, 2101, 10):
+                timeline.append_new_statuses(statuses(i, i + 9))
+
+        writer = threading.Thread(target=merge)
+        writer.start()
+        while writer.is_alive():
+            snapshot = timeline.snapshot()
+            self.assertEqual(snapshot.statuses[snapshot.current].id, selected)
+        writer.join()
+        self.assertEqual(timeline.current_status().id, selected)
+        self.assertEqual(timeline.count, 2100)
+
+class BenchTimeline(unittest.TestCase):
+    '''Lookups must not depend on how many statuses the timeline holds'''
+
+    def setUp(self):
+        helpers.setup_statuses()
+
+    def bench(self, size):
+        timeline = Timeline()
+        timeline.append_new_statuses(statuses(1, size))
+        timeline.last_read = 1
+        batch = statuses(size - 10, size + 10)
+
+        def lookup():
+            timeline.unknown_statuses(batch)
+            timeline.count_unread()
+            timeline.find_current(1)
+
+        return min(timeit.repeat(lookup, number=1000, repeat=3))
+
+    def test_50k_statuses(self):
+        small = self.bench(500)
+        large = self.bench(50000)
+        # a linear scan would be a hundred times slower
+        self.assertLess(large, small * 10)
+
+if __name__ == '__main__':
+    unittest.main ()
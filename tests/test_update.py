@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2011 Nicolas Paris <nicolas.caen@gmail.com>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import sys
+import time
+import gettext
+gettext.install('tyrs', unicode=1)
+
+sys.path.insert(0, '../src')
+import tyrs
+import helpers
+from update import UpdateThread
+from ratelimit import RateLimit
+from events import EventQueue
+
+class FakeConf(helpers.FakeConf):
+    refresh = {'home': 2, 'mentions': 2, 'direct': 10, 'search': 5, 'user': 0}
+
+    def __init__(self):
+        self.params = {
+            'refresh_adaptive': 1,
+            'refresh_min':      1,
+            'refresh_max':      30,
+            'rate_budget':      0,
+        }
+
+class FakeApi(object):
+    search_word = None
+    search_user = None
+
+    def __init__(self):
+        self.updates = []
+
+    def update_timelines(self, timelines):
+        self.updates.extend(timelines)
+        return dict((buff, 0) for buff in timelines)
+
+class FakeStream(object):
+    connected = True
+
+    def covers(self, buff):
+        return self.connected and buff in ('home', 'mentions', 'direct')
+
+class TestUpdateThread(unittest.TestCase):
+
+    def setUp(self):
+        tyrs.container.add('conf', FakeConf())
+        tyrs.container.add('interface', helpers.FakeInterface())
+        tyrs.container.add('api', FakeApi())
+        tyrs.container.add('rate_limit', RateLimit())
+        tyrs.container.add('events', EventQueue())
+        self.thread = UpdateThread()
+        # fixed intervals, short enough for the tests
+        tyrs.container['conf'].params['refresh_adaptive'] = 0
+
+    def tearDown(self):
+        self.thread.stop()
+        if self.thread.is_alive():
+            self.thread.join(1)
+
+    def start(self, intervals):
+        self.thread.intervals = intervals
+        self.thread.schedule_all()
+        self.thread.start()
+
+    def test_intervals(self):
+        self.assertEqual(self.thread.intervals,
+            {'home': 120, 'mentions': 120, 'direct': 600, 'search': 300})
+
+    def test_each_timeline_on_its_own(self):
+        self.start({'home': 0.05, 'direct': 60})
+        updates = tyrs.container['api'].updates
+        self.assertTrue(helpers.wait_for(lambda: updates.count('home') >= 3))
+        self.assertEqual(updates.count('direct'), 0)
+
+    def test_inactive_search(self):
+        self.start({'search': 0.05})
+        time.sleep(0.2)
+        self.assertEqual(tyrs.container['api'].updates, [])
+
+    def test_streamed_not_polled(self):
+        self.thread.stream = FakeStream()
+        self.start({'home': 0.05, 'search': 0.05})
+        tyrs.container['api'].search_word = 'tyrs'
+        updates = tyrs.container['api'].updates
+        self.assertTrue(helpers.wait_for(lambda: 'search' in updates))
+        self.assertFalse('home' in updates)
+        self.thread.stream.connected = False
+        self.assertTrue(helpers.wait_for(lambda: 'home' in updates))
+
+    def test_schedule_sooner(self):
+        self.start({'home': 60})
+        self.thread.schedule('home', 0)
+        updates = tyrs.container['api'].updates
+        self.assertTrue(helpers.wait_for(lambda: updates))
+        self.assertEqual(updates, ['home'])
+
+    def test_rate_limit_postpones(self):
+        tyrs.container['rate_limit'].update({'x-ratelimit-limit': '350',
+            'x-ratelimit-remaining': '5', 'x-ratelimit-reset': str(int(time.time()) + 600)})
+        self.start({'home': 0.05})
+        self.assertTrue(helpers.wait_for(
+            lambda: self.thread.jobs and self.thread.jobs[0][0] > time.time() + 500))
+        self.assertEqual(tyrs.container['api'].updates, [])
+
+    def test_stop(self):
+        self.start({'home': 60})
+        self.thread.stop()
+        # woken at once, not when home is due
+        self.thread.join(5)
+        self.assertFalse(self.thread.is_alive())
+
+class TestAdaptiveInterval(unittest.TestCase):
+
+    def setUp(self):
+        tyrs.container.add('conf', FakeConf())
+        tyrs.container.add('interface', helpers.FakeInterface())
+        tyrs.container.add('api', FakeApi())
+        tyrs.container.add('rate_limit', RateLimit())
+        tyrs.container.add('events', EventQueue())
+        self.thread = UpdateThread()
+        self.params = tyrs.container['conf'].params
+
+    def test_quiet_backs_off(self):
+        intervals = [self.thread.next_interval('direct', 0) for i in range(4)]
+        self.assertEqual(intervals, [1200, 1800, 1800, 1800])
+
+    def test_busy_tightens(self):
+        # 120 new statuses in 2 minutes
+        self.assertEqual(self.thread.next_interval('home', 120), 60)
+
+    def test_activity_smoothed(self):
+        self.thread.next_interval('home', 12)
+        self.thread.last_update['home'] -= 60
+        # half the rate of the first update, and none now
+        self.assertEqual(self.thread.next_interval('home', 0), 100)
+
+    def test_failure_keeps_interval(self):
+        self.assertEqual(self.thread.next_interval('home', None), 120)
+
+    def test_fixed(self):
+        self.params['refresh_adaptive'] = 0
+        self.assertEqual(self.thread.next_interval('direct', 0), 600)
+
+    def test_budget_from_api(self):
+        # 4 timelines, 30 requests left for the next half hour
+        tyrs.container['rate_limit'].update({'x-ratelimit-limit': '350',
+            'x-ratelimit-remaining': '40', 'x-ratelimit-reset': str(int(time.time()) + 1800)})
+        self.assertAlmostEqual(self.thread.next_interval('home', 120), 240, delta=1)
+
+    def test_budget(self):
+        # 4 timelines, 60 requests an hour
+        self.params['rate_budget'] = 60
+        self.assertEqual(self.thread.next_interval('home', 120), 240)
+
+if __name__ == '__main__':
+    unittest.main ()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2011 Nicolas Paris <nicolas.caen@gmail.com>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import sys
+import timeit
+sys.path.insert(0, '../src')
+from viewport import Viewport
+
+def viewport(overlap=0):
+    '''Eleven lines for the statuses, each status as high as its value'''
+    return Viewport(1, 12, lambda height: height, overlap)
+
+class TestViewport(unittest.TestCase):
+
+    def test_last(self):
+        self.assertEqual(viewport().last([3, 3, 3, 3, 3], 0), 2)
+        self.assertEqual(viewport().last([3, 3, 3, 3, 3], 3), 4)
+        self.assertEqual(viewport(overlap=1).last([3, 3, 3, 3, 3], 0), 4)
+
+    def test_too_high(self):
+        self.assertEqual(viewport().last([20, 3], 0), 0)
+        self.assertEqual(viewport().first([3, 20], 1), 1)
+
+    def test_first(self):
+        self.assertEqual(viewport().first([3, 3, 3, 3, 3], 4), 2)
+        self.assertEqual(viewport().first([3, 3, 3, 3, 3], 1), 0)
+
+    def test_scroll_to(self):
+        statuses = [3] * 10
+        self.assertEqual(viewport().scroll_to(statuses, 4, 2), 2)
+        self.assertEqual(viewport().scroll_to(statuses, 4, 5), 4)
+        self.assertEqual(viewport().scroll_to(statuses, 4, 8), 6)
+
+    def test_pages(self):
+        statuses = [3] * 10
+        self.assertEqual(viewport().page_down(statuses, 0), 3)
+        self.assertEqual(viewport().page_down(statuses, 8), 9)
+        self.assertEqual(viewport().page_up(statuses, 3), 0)
+        self.assertEqual(viewport().page_up(statuses, 0), 0)
+
+class BenchViewport(unittest.TestCase):
+    '''Paging must not depend on how many statuses the timeline holds'''
+
+    def bench(self, size):
+        statuses = [3] * size
+        view = viewport()
+
+        def paging():
+            first = view.page_down(statuses, size / 2)
+            view.page_up(statuses, first)
+            view.scroll_to(statuses, 0, size - 1)
+
+        return min(timeit.repeat(paging, number=1000, repeat=3))
+
+    def test_50k_statuses(self):
+        small = self.bench(500)
+        large = self.bench(50000)
+        self.assertLess(large, small * 10)
+
+if __name__ == '__main__':
+    unittest.main ()
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2011 Nicolas Paris <nicolas.caen@gmail.com>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import sys
+import time
+import threading
+sys.path.insert(0, '../src')
+from workers import WorkerPool
+
+class Running(object):
+    '''How many tasks run at once'''
+    lock = threading.Lock()
+    now = 0
+    most = 0
+
+def slow_square(i):
+    with Running.lock:
+        Running.now += 1
+        Running.most = max(Running.most, Running.now)
+    time.sleep(0.2)
+    with Running.lock:
+        Running.now -= 1
+    return i * i
+
+def fail(i):
+    if i == 2:
+        raise ValueError(i)
+    return i
+
+class TestWorkerPool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = WorkerPool(5)
+        Running.most = 0
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_parallel(self):
+        results = self.pool.map(slow_square, range(5))
+        self.assertEqual(results, [0, 1, 4, 9, 16])
+        self.assertGreater(Running.most, 1)
+
+    def test_failure(self):
+        self.assertEqual(self.pool.map(fail, range(4)), [0, 1, None, 3])
+
+    def test_single_worker(self):
+        pool = WorkerPool(1)
+        self.assertEqual(pool.map(slow_square, [1, 2]), [1, 4])
+        self.assertEqual(Running.most, 1)
+        pool.close()
+
+if __name__ == '__main__':
+    unittest.main ()